@@ -1,13 +1,27 @@
 import os
+import asyncio
+import hashlib
 import requests
 import PyPDF2
+try:
+    import pypdfium2 as pdfium
+except ImportError:
+    pdfium = None
+try:
+    from selectolax.parser import HTMLParser
+except ImportError:
+    HTMLParser = None
 from io import BytesIO
 import re
-import random
-from langchain.llms import OpenAI
+import json
+import numpy as np
+from langchain.chat_models import ChatOpenAI
 from langchain.chains import LLMChain
 from langchain.prompts import PromptTemplate
+from langchain.text_splitter import RecursiveCharacterTextSplitter
 from dotenv import load_dotenv
+from config import AI_CONFIG
+from database import cached_call
 
 # Load environment variables
 load_dotenv()
@@ -15,6 +29,99 @@ load_dotenv()
 # OpenAI API key
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
 
+# In-process cache of finished analyses, keyed by project and whitepaper hash
+ANALYSIS_CACHE_SIZE = 128
+_analysis_cache = {}
+
+# Generator for mock ratings
+_RNG = np.random.default_rng()
+
+# Largest whitepaper download accepted, in bytes
+WHITEPAPER_MAX_BYTES = 10 * 1024 * 1024
+
+# Maximum number of whitepaper characters sent to the model
+WHITEPAPER_MAX_LENGTH = AI_CONFIG["whitepaper_max_length"]
+ASPECT_CONTEXT_LENGTH = AI_CONFIG["aspect_context_length"]
+
+# Number of whitepaper characters searched for relevant chunks
+WHITEPAPER_SCAN_LENGTH = AI_CONFIG["whitepaper_scan_length"]
+
+# Splits whitepapers into chunks that are ranked and selected per prompt
+WHITEPAPER_SPLITTER = RecursiveCharacterTextSplitter(chunk_size=800, chunk_overlap=100)
+
+# Aspects covered by the whitepaper analysis, in display order
+ANALYSIS_ASPECTS = ("security", "growth", "risk", "technology")
+
+# Keywords used to rank whitepaper chunks by relevance to each aspect
+ASPECT_KEYWORDS = {
+    "security": ("security", "audit", "attack", "vulnerab", "consensus", "validator",
+                 "cryptograph", "signature", "smart contract", "exploit", "slashing"),
+    "growth": ("adoption", "market", "partner", "ecosystem", "user", "roadmap",
+               "community", "growth", "developer", "integration"),
+    "risk": ("risk", "regulat", "compliance", "legal", "competit", "tokenomics",
+             "supply", "inflation", "vesting", "allocation", "governance"),
+    "technology": ("protocol", "architecture", "scalab", "throughput", "layer",
+                   "sharding", "rollup", "virtual machine", "interoperab", "latency", "novel")
+}
+
+# Rating formats recognised by extract_rating
+RATING_OUT_OF_10_PATTERN = re.compile(r'(\d+(?:\.\d+)?)\s*(?:/|out of)\s*10')
+RATING_WORD_PATTERN = re.compile(r'rating\D*(\d+(?:\.\d+)?)', re.IGNORECASE)
+
+# Every analysis prompt starts with the whitepaper text so that repeated
+# requests share a byte-identical prefix that the provider can cache.
+# Project-specific wording must come after this prefix.
+WHITEPAPER_PROMPT_PREFIX = "Whitepaper text:\n{text}\n\n"
+
+# Maximum number of OpenAI requests in flight for a single analysis
+LLM_CONCURRENCY = 4
+
+def run_chain_cached(chain, **inputs):
+    """
+    Runs an LLM chain through the persistent response cache
+    
+    Responses are keyed by the rendered prompt and the model settings, and
+    RESPONSE_CACHE_MODE applies as for every other cached API call.
+    
+    Args:
+        chain (LLMChain): Chain to run
+        **inputs: Prompt variables
+    
+    Returns:
+        str: Model response
+    """
+    llm = chain.llm
+    payload = {
+        "prompt": chain.prompt.format(**inputs),
+        "model": llm.model_name,
+        "temperature": llm.temperature,
+        "max_tokens": llm.max_tokens
+    }
+    
+    return cached_call("openai", payload, lambda: chain.run(**inputs))
+
+async def _run_chains_concurrently(chains, chain_inputs):
+    """
+    Runs independent LLM chains concurrently, each through the response cache
+    
+    Args:
+        chains (list): LLMChain objects to run
+        chain_inputs (list): Prompt variables for each chain, in the same order
+    
+    Returns:
+        list: Chain outputs in the same order as chains
+    """
+    semaphore = asyncio.Semaphore(LLM_CONCURRENCY)
+    
+    async def run_chain(chain, inputs):
+        async with semaphore:
+            # The cache is synchronous SQLite, so each cached run gets its own thread
+            return await asyncio.to_thread(run_chain_cached, chain, **inputs)
+    
+    return await asyncio.gather(*(
+        run_chain(chain, inputs) for chain, inputs in zip(chains, chain_inputs)
+    ))
+
 def analyze_whitepaper(project_name, url=None):
     """
     Analyzes a cryptocurrency project whitepaper using LangChain and OpenAI
@@ -32,26 +139,18 @@ def analyze_whitepaper(project_name, url=None):
     if url:
         try:
             # Download the whitepaper
-            response = requests.get(url, timeout=30)
+            content, content_type, encoding = download_whitepaper(url, WHITEPAPER_MAX_BYTES)
             
-            # Check if it's a PDF
-            if url.lower().endswith('.pdf'):
-                # Read PDF content
-                pdf_file = BytesIO(response.content)
-                pdf_reader = PyPDF2.PdfReader(pdf_file)
-                
-                # Extract text from each page
-                for page_num in range(len(pdf_reader.pages)):
-                    page = pdf_reader.pages[page_num]
-                    whitepaper_text += page.extract_text()
+            # Check if it's a PDF by what was served, not by the URL
+            if is_pdf_content(content, content_type):
+                # Read PDF content up to the scan budget
+                whitepaper_text = extract_pdf_text(content, WHITEPAPER_SCAN_LENGTH)
             else:
                 # Assume it's HTML or plain text
-                whitepaper_text = response.text
-                # Clean HTML tags if necessary
-                whitepaper_text = re.sub(r'<.*?>', ' ', whitepaper_text)
+                whitepaper_text = extract_html_text(content.decode(encoding or 'utf-8', errors='replace'))
             
-            # Truncate to a manageable size for API
-            whitepaper_text = whitepaper_text[:15000]  # Truncate to ~15k chars
+            # Truncate to the portion searched for relevant chunks
+            whitepaper_text = whitepaper_text[:WHITEPAPER_SCAN_LENGTH]
             
         except Exception as e:
             print(f"Error downloading or processing whitepaper: {e}")
@@ -62,39 +161,35 @@ def analyze_whitepaper(project_name, url=None):
         whitepaper_text = f"Analysis requested for the {project_name} cryptocurrency project. " \
                           f"No whitepaper provided, please analyze based on publicly known information."
     
+    # Reuse a finished analysis of the same project and whitepaper
+    cache_key = hashlib.sha256((project_name + "\0" + whitepaper_text).encode("utf-8")).hexdigest()
+    
+    if cache_key in _analysis_cache:
+        return dict(_analysis_cache[cache_key])
+    
     # Initialize the LLM
     if OPENAI_API_KEY:
         try:
-            llm = OpenAI(openai_api_key=OPENAI_API_KEY, temperature=0.2)
-            
-            # Create analysis prompts
-            security_prompt = PromptTemplate(
-                input_variables=["text", "project"],
-                template="Analyze the security aspects of the {project} cryptocurrency project based on this text: {text}\n\n" 
-                         "Focus on smart contract security, consensus mechanism safety, potential vulnerabilities, " 
-                         "and overall security practices. Rate it from 0-10 and explain your rating."
-            )
-            
-            growth_prompt = PromptTemplate(
-                input_variables=["text", "project"],
-                template="Analyze the growth potential of the {project} cryptocurrency project based on this text: {text}\n\n" 
-                         "Focus on market opportunity, adoption strategy, competitive advantages, and ecosystem development. " 
-                         "Rate it from 0-10 and explain your rating."
-            )
+            # Output length drives latency, so each call gets its own token cap
+            analysis_llm = create_llm(AI_CONFIG["max_tokens"] * len(ANALYSIS_ASPECTS))
+            aspect_llm = create_llm(AI_CONFIG["max_tokens"])
+            summary_llm = create_llm(AI_CONFIG["summary_max_tokens"])
             
-            risk_prompt = PromptTemplate(
+            # Single prompt covering all four aspects so the whitepaper text is sent once
+            analysis_prompt = PromptTemplate(
                 input_variables=["text", "project"],
-                template="Analyze the investment risks of the {project} cryptocurrency project based on this text: {text}\n\n" 
-                         "Focus on regulatory concerns, market competition, technical challenges, and tokenomics issues. " 
-                         "Rate it from 0-10 (where 10 is lowest risk) and explain your rating."
-            )
-            
-            tech_prompt = PromptTemplate(
-                input_variables=["text", "project"],
-                template="Analyze the technological uniqueness and innovation of the {project} cryptocurrency project " 
-                         "based on this text: {text}\n\n" 
-                         "Focus on novel approaches, improvements over existing solutions, technical feasibility, " 
-                         "and potential impact on the blockchain space. Rate it from 0-10 and explain your rating."
+                template=WHITEPAPER_PROMPT_PREFIX + 
+                         "Analyze the {project} cryptocurrency project based on the whitepaper text above.\n\n" 
+                         "Assess the following four aspects, rating each from 0-10 and explaining the rating:\n" 
+                         "- security: smart contract security, consensus mechanism safety, potential vulnerabilities, " 
+                         "and overall security practices.\n" 
+                         "- growth: market opportunity, adoption strategy, competitive advantages, and ecosystem development.\n" 
+                         "- risk: regulatory concerns, market competition, technical challenges, and tokenomics issues " 
+                         "(where 10 is lowest risk).\n" 
+                         "- technology: novel approaches, improvements over existing solutions, technical feasibility, " 
+                         "and potential impact on the blockchain space.\n\n" 
+                         "Respond ONLY as JSON: {{\"security\": {{\"analysis\": \"...\", \"rating\": 0}}, " 
+                         "\"growth\": {{...}}, \"risk\": {{...}}, \"technology\": {{...}}}}"
             )
             
             summary_prompt = PromptTemplate(
@@ -109,26 +204,31 @@ def analyze_whitepaper(project_name, url=None):
             )
             
             # Create chains
-            security_chain = LLMChain(llm=llm, prompt=security_prompt)
-            growth_chain = LLMChain(llm=llm, prompt=growth_prompt)
-            risk_chain = LLMChain(llm=llm, prompt=risk_prompt)
-            tech_chain = LLMChain(llm=llm, prompt=tech_prompt)
-            summary_chain = LLMChain(llm=llm, prompt=summary_prompt)
-            
-            # Run analysis
-            security_analysis = security_chain.run(text=whitepaper_text, project=project_name)
-            growth_analysis = growth_chain.run(text=whitepaper_text, project=project_name)
-            risk_analysis = risk_chain.run(text=whitepaper_text, project=project_name)
-            tech_analysis = tech_chain.run(text=whitepaper_text, project=project_name)
-            
-            # Extract ratings
-            security_rating = extract_rating(security_analysis)
-            growth_rating = extract_rating(growth_analysis)
-            risk_rating = extract_rating(risk_analysis)
-            tech_rating = extract_rating(tech_analysis)
+            analysis_chain = LLMChain(llm=analysis_llm, prompt=analysis_prompt)
+            summary_chain = LLMChain(llm=summary_llm, prompt=summary_prompt)
+            
+            # Send the chunks most relevant to the four aspects instead of the head of the text
+            whitepaper_chunks = WHITEPAPER_SPLITTER.split_text(whitepaper_text)
+            all_keywords = tuple(keyword for aspect in ANALYSIS_ASPECTS for keyword in ASPECT_KEYWORDS[aspect])
+            context = select_relevant_chunks(whitepaper_chunks, all_keywords, WHITEPAPER_MAX_LENGTH)
+            
+            # Run the combined analysis
+            sections = parse_analysis_sections(
+                run_chain_cached(analysis_chain, text=context, project=project_name)
+            )
+            
+            if sections is None:
+                # The model did not return usable JSON, so ask for each aspect separately
+                sections = run_aspect_analyses(aspect_llm, whitepaper_chunks, project_name)
+            
+            security_analysis, security_rating = sections['security']
+            growth_analysis, growth_rating = sections['growth']
+            risk_analysis, risk_rating = sections['risk']
+            tech_analysis, tech_rating = sections['technology']
             
             # Generate summary
-            summary = summary_chain.run(
+            summary = run_chain_cached(
+                summary_chain,
                 security=security_analysis,
                 growth=growth_analysis,
                 risk=risk_analysis,
@@ -137,7 +237,7 @@ def analyze_whitepaper(project_name, url=None):
             )
             
             # Return analysis results
-            return {
+            result = {
                 'security': security_analysis,
                 'growth': growth_analysis,
                 'risk': risk_analysis,
@@ -149,12 +249,174 @@ def analyze_whitepaper(project_name, url=None):
                 'tech_rating': tech_rating
             }
             
+            # Evict the oldest entry once the cache is full
+            if len(_analysis_cache) >= ANALYSIS_CACHE_SIZE:
+                _analysis_cache.pop(next(iter(_analysis_cache)))
+            _analysis_cache[cache_key] = result
+            
+            return dict(result)
+            
         except Exception as e:
             print(f"Error during AI analysis: {e}")
     
     # Fallback with mock analysis if OpenAI API is not available or fails
     return generate_mock_analysis(project_name)
 
+def create_llm(max_tokens):
+    """
+    Creates the chat model used for whitepaper analysis
+    
+    Args:
+        max_tokens (int): Maximum number of tokens in the response
+    
+    Returns:
+        ChatOpenAI: Configured chat model
+    """
+    return ChatOpenAI(
+        openai_api_key=OPENAI_API_KEY,
+        model_name=AI_CONFIG["model"],
+        temperature=AI_CONFIG["temperature"],
+        max_tokens=max_tokens,
+        request_timeout=AI_CONFIG["request_timeout"]
+    )
+
+def download_whitepaper(url, max_bytes):
+    """
+    Streams a whitepaper download, refusing anything larger than max_bytes
+    
+    Args:
+        url (str): URL to the whitepaper
+        max_bytes (int): Maximum number of bytes to read
+    
+    Returns:
+        tuple: Raw content bytes, Content-Type header and text encoding (or None)
+    """
+    with requests.get(url, stream=True, timeout=30) as response:
+        response.raise_for_status()
+        
+        # Reject early when the server declares an oversized body
+        declared_length = response.headers.get('Content-Length')
+        if declared_length and declared_length.isdigit() and int(declared_length) > max_bytes:
+            raise ValueError(f"Whitepaper is larger than {max_bytes} bytes")
+        
+        buffer = BytesIO()
+        for chunk in response.iter_content(chunk_size=64 * 1024):
+            buffer.write(chunk)
+            if buffer.tell() > max_bytes:
+                raise ValueError(f"Whitepaper is larger than {max_bytes} bytes")
+        
+        return buffer.getvalue(), response.headers.get('Content-Type', ''), response.encoding
+
+def is_pdf_content(content, content_type):
+    """
+    Checks whether a download is a PDF from its Content-Type or magic bytes
+    
+    Args:
+        content (bytes): Downloaded content
+        content_type (str): Content-Type response header
+    
+    Returns:
+        bool: True if the content should be parsed as a PDF
+    """
+    # Readers accept the %PDF- header anywhere in the first 1024 bytes
+    return 'pdf' in content_type.lower() or b'%PDF-' in content[:1024]
+
+def extract_pdf_text(pdf_bytes, max_chars):
+    """
+    Extracts text from a PDF, stopping once enough text has been collected
+    
+    Uses the PDFium bindings when available and falls back to PyPDF2.
+    
+    Args:
+        pdf_bytes (bytes): Raw PDF content
+        max_chars (int): Number of characters needed
+    
+    Returns:
+        str: Extracted text, at most max_chars long
+    """
+    chunks = []
+    total = 0
+    
+    if pdfium is not None:
+        pdf = pdfium.PdfDocument(pdf_bytes)
+        try:
+            for page in pdf:
+                textpage = page.get_textpage()
+                page_text = textpage.get_text_range()
+                textpage.close()
+                page.close()
+                
+                chunks.append(page_text)
+                total += len(page_text)
+                
+                if total >= max_chars:
+                    break
+        finally:
+            pdf.close()
+    else:
+        pdf_reader = PyPDF2.PdfReader(BytesIO(pdf_bytes))
+        
+        # Pages are parsed lazily, so later pages are never touched once the budget is met
+        for page in pdf_reader.pages:
+            page_text = page.extract_text() or ""
+            chunks.append(page_text)
+            total += len(page_text)
+            
+            if total >= max_chars:
+                break
+    
+    return "\n".join(chunks)[:max_chars]
+
+def extract_html_text(html):
+    """
+    Converts an HTML (or plain text) document to visible text
+    
+    Script and style contents are dropped. Falls back to stripping tags with
+    a regex when selectolax is not installed.
+    
+    Args:
+        html (str): Document content
+    
+    Returns:
+        str: Extracted text
+    """
+    if HTMLParser is not None:
+        tree = HTMLParser(html)
+        tree.strip_tags(['script', 'style', 'noscript'])
+        
+        if tree.body is not None:
+            return tree.body.text(separator=' ')
+    
+    # Clean HTML tags if necessary
+    return re.sub(r'<.*?>', ' ', html)
+
+def select_relevant_chunks(chunks, keywords, max_chars):
+    """
+    Selects the chunks with the most keyword matches that fit within max_chars
+    
+    Args:
+        chunks (list): Text chunks in document order
+        keywords (tuple): Lower-case keywords (or word stems) to match
+        max_chars (int): Character budget for the selected text
+    
+    Returns:
+        str: Selected chunks joined in document order
+    """
+    scores = [sum(chunk.lower().count(keyword) for keyword in keywords) for chunk in chunks]
+    
+    # Highest score first, earlier chunks first among equal scores
+    ranked = sorted(range(len(chunks)), key=lambda i: (-scores[i], i))
+    
+    selected = []
+    total = 0
+    for i in ranked:
+        if total + len(chunks[i]) > max_chars:
+            continue
+        selected.append(i)
+        total += len(chunks[i])
+    
+    return "\n\n".join(chunks[i] for i in sorted(selected))
+
 def extract_rating(analysis_text):
     """
     Extracts numerical rating from analysis text
@@ -166,15 +428,13 @@ def extract_rating(analysis_text):
         float: Extracted rating from 0-10
     """
     # Try to find a rating in format of X/10 or X out of 10
-    pattern = r'(\d+(\.\d+)?)\s*(/|out of)\s*10'
-    match = re.search(pattern, analysis_text)
+    match = RATING_OUT_OF_10_PATTERN.search(analysis_text)
     
     if match:
         return float(match.group(1))
     
     # Try to find any number between 0 and 10
-    pattern = r'rating\D*(\d+(\.\d+)?)'
-    match = re.search(pattern, analysis_text.lower())
+    match = RATING_WORD_PATTERN.search(analysis_text)
     
     if match:
         rating = float(match.group(1))
@@ -184,6 +444,117 @@ def extract_rating(analysis_text):
     # Default to a middle rating if not found
     return 5.0
 
+def parse_analysis_sections(response_text):
+    """
+    Parses the JSON response of the combined analysis prompt
+    
+    Args:
+        response_text (str): Raw model output
+    
+    Returns:
+        dict: Mapping of aspect name to (analysis, rating), or None if the
+            response is not valid JSON with all four aspects
+    """
+    # Tolerate prose or code fences around the JSON object
+    start = response_text.find('{')
+    end = response_text.rfind('}')
+    
+    if start == -1 or end <= start:
+        return None
+    
+    try:
+        data = json.loads(response_text[start:end + 1])
+    except ValueError:
+        return None
+    
+    sections = {}
+    for aspect in ANALYSIS_ASPECTS:
+        section = data.get(aspect) if isinstance(data, dict) else None
+        
+        if not isinstance(section, dict) or not section.get('analysis'):
+            return None
+        
+        analysis = str(section['analysis'])
+        
+        try:
+            rating = float(section.get('rating'))
+        except (TypeError, ValueError):
+            rating = None
+        
+        if rating is None or not 0 <= rating <= 10:
+            rating = extract_rating(analysis)
+        
+        sections[aspect] = (analysis, rating)
+    
+    return sections
+
+def run_aspect_analyses(llm, whitepaper_chunks, project_name):
+    """
+    Analyzes each aspect with its own prompt, running the requests concurrently
+    
+    Each prompt only receives the whitepaper chunks most relevant to its aspect.
+    
+    Args:
+        llm: LangChain LLM to use
+        whitepaper_chunks (list): Whitepaper text split into chunks
+        project_name (str): Name of the project
+    
+    Returns:
+        dict: Mapping of aspect name to (analysis, rating)
+    """
+    security_prompt = PromptTemplate(
+        input_variables=["text", "project"],
+        template=WHITEPAPER_PROMPT_PREFIX + 
+                 "Analyze the security aspects of the {project} cryptocurrency project based on the whitepaper text above. " 
+                 "Focus on smart contract security, consensus mechanism safety, potential vulnerabilities, " 
+                 "and overall security practices. Rate it from 0-10 and explain your rating."
+    )
+    
+    growth_prompt = PromptTemplate(
+        input_variables=["text", "project"],
+        template=WHITEPAPER_PROMPT_PREFIX + 
+                 "Analyze the growth potential of the {project} cryptocurrency project based on the whitepaper text above. " 
+                 "Focus on market opportunity, adoption strategy, competitive advantages, and ecosystem development. " 
+                 "Rate it from 0-10 and explain your rating."
+    )
+    
+    risk_prompt = PromptTemplate(
+        input_variables=["text", "project"],
+        template=WHITEPAPER_PROMPT_PREFIX + 
+                 "Analyze the investment risks of the {project} cryptocurrency project based on the whitepaper text above. " 
+                 "Focus on regulatory concerns, market competition, technical challenges, and tokenomics issues. " 
+                 "Rate it from 0-10 (where 10 is lowest risk) and explain your rating."
+    )
+    
+    tech_prompt = PromptTemplate(
+        input_variables=["text", "project"],
+        template=WHITEPAPER_PROMPT_PREFIX + 
+                 "Analyze the technological uniqueness and innovation of the {project} cryptocurrency project " 
+                 "based on the whitepaper text above. " 
+                 "Focus on novel approaches, improvements over existing solutions, technical feasibility, " 
+                 "and potential impact on the blockchain space. Rate it from 0-10 and explain your rating."
+    )
+    
+    chains = [
+        LLMChain(llm=llm, prompt=prompt)
+        for prompt in (security_prompt, growth_prompt, risk_prompt, tech_prompt)
+    ]
+    
+    chain_inputs = [
+        {
+            "text": select_relevant_chunks(whitepaper_chunks, ASPECT_KEYWORDS[aspect], ASPECT_CONTEXT_LENGTH),
+            "project": project_name
+        }
+        for aspect in ANALYSIS_ASPECTS
+    ]
+    
+    analyses = asyncio.run(_run_chains_concurrently(chains, chain_inputs))
+    
+    return {
+        aspect: (analysis, extract_rating(analysis))
+        for aspect, analysis in zip(ANALYSIS_ASPECTS, analyses)
+    }
+
 def generate_mock_analysis(project_name):
     """
     Generates mock analysis results when AI analysis is not available
@@ -195,10 +566,9 @@ def generate_mock_analysis(project_name):
         dict: Mock analysis results
     """
     # Generate random ratings
-    security_rating = round(random.uniform(5.0, 8.5), 1)
-    growth_rating = round(random.uniform(5.0, 9.0), 1)
-    risk_rating = round(random.uniform(4.0, 7.5), 1)
-    tech_rating = round(random.uniform(5.5, 8.5), 1)
+    security_rating, growth_rating, risk_rating, tech_rating = np.round(
+        _RNG.uniform([5.0, 5.0, 4.0, 5.5], [8.5, 9.0, 7.5, 8.5]), 1
+    ).tolist()
     
     security = f"""The {project_name} project demonstrates a satisfactory security framework with some noteworthy features in its consensus mechanism. The smart contract architecture implements industry-standard security practices and has undergone external audits. However, there are some potential concerns regarding centralization of validators and certain edge case vulnerabilities that may require further attention. The project shows commitment to security through bug bounty programs and regular security updates. Rating: {security_rating}/10"""
     
@@ -1,10 +1,18 @@
 import pandas as pd
+import numpy as np
 import requests
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from datetime import datetime, timedelta
+from dateutil.tz import tzlocal
 import time
-import random
+import orjson
 import os
+import functools
 from dotenv import load_dotenv
+from config import API_CONFIG
+from rate_limit import get_limiter
 
 # Load environment variables
 load_dotenv()
@@ -19,100 +27,137 @@ COINGECKO_BASE_URL = "https://api.coingecko.com/api/v3"
 COINMARKETCAP_BASE_URL = "https://pro-api.coinmarketcap.com/v1"
 BINANCE_BASE_URL = "https://api.binance.com/api/v3"
 
-# Helper function to handle API rate limits
-def make_api_request(url, params=None, headers=None, retries=3, backoff_factor=0.5):
+# Shared generator for mock/fallback data
+_RNG = np.random.default_rng()
+
+# Maximum number of CoinGecko requests issued in parallel
+MAX_CONCURRENT_REQUESTS = 8
+
+# Shared HTTP session so CoinGecko calls reuse pooled keep-alive connections.
+# The pool blocks instead of opening throwaway sockets when every pooled
+# connection is busy, so concurrent callers queue on warm connections.
+_SESSION = requests.Session()
+_SESSION.mount("https://", HTTPAdapter(
+    pool_connections=16,
+    pool_maxsize=MAX_CONCURRENT_REQUESTS,
+    pool_block=True,
+    max_retries=Retry(
+        total=3,
+        backoff_factor=0.5,
+        status_forcelist=[429, 500, 502, 503, 504],
+        respect_retry_after_header=True
+    )
+))
+if COINGECKO_API_KEY:
+    _SESSION.headers.update({"x-cg-pro-api-key": COINGECKO_API_KEY})
+
+# On-disk cache of the CoinGecko coin list, shared by symbol lookups and the token list
+COINS_LIST_CACHE_PATH = os.path.join("data", "coins_list.json")
+COINS_LIST_CACHE_TTL = 24 * 3600  # Seconds
+
+# In-memory copy of the cached coin list as a symbol -> id index
+_symbol_index_cache = {"loaded_at": 0, "index": None}
+
+# Client-side throttle so bursts are spread out instead of hitting 429s
+_COINGECKO_LIMITER = get_limiter(
+    "coingecko",
+    rpm=API_CONFIG["coingecko"]["pro_request_limit"] if COINGECKO_API_KEY else None
+)
+
+def _get_json(url, params=None):
     """
-    Makes an API request with retry logic and exponential backoff
+    Fetches and decodes a JSON document over the shared session
+    
+    Requests are throttled to the CoinGecko rate limit before being sent.
+    Any 429 or transient server error that still occurs is retried with
+    exponential backoff (honoring Retry-After) by the mounted adapter.
     """
-    if headers is None:
-        headers = {}
-        if COINGECKO_API_KEY:
-            headers["x-cg-pro-api-key"] = COINGECKO_API_KEY
-        
-        response = make_api_request(url, params=params, headers=headers)
-        
-        # Process and structure the data
-        market_data = {
-            'date': [],
-            'market_cap': [],
-            'volume': [],
-            'btc_dominance': []
-        }
-        
-        for entry in response['market_cap_chart']['market_cap_by_date']:
-            timestamp = entry[0] / 1000  # Convert milliseconds to seconds
-            date = datetime.fromtimestamp(timestamp)
-            market_cap = entry[1]
-            
-            market_data['date'].append(date)
-            market_data['market_cap'].append(market_cap)
-        
-        # Get volume data (may require additional API call)
-        url = f"{COINGECKO_BASE_URL}/global"
-        response = make_api_request(url, headers=headers)
-        
-        # Fill in latest volume and add historical estimates
-        latest_volume = response['data']['total_volume']['usd']
-        latest_btc_dominance = response['data']['market_cap_percentage']['btc']
-        
-        # Simulate historical data if not available
-        volume_factor = latest_volume / market_data['market_cap'][-1]
-        
-        for i, market_cap in enumerate(market_data['market_cap']):
-            # Estimate volume based on market cap with some random variation
-            if i == len(market_data['market_cap']) - 1:
-                volume = latest_volume
-            else:
-                # Add some randomness to make it look realistic
-                variation = random.uniform(0.8, 1.2)
-                volume = market_cap * volume_factor * variation
-            
-            market_data['volume'].append(volume)
-            
-            # Estimate BTC dominance (historically higher)
-            days_ago = (market_data['date'][-1] - market_data['date'][i]).days
-            if days_ago == 0:
-                dominance = latest_btc_dominance
-            else:
-                # BTC dominance was higher in the past
-                additional_dominance = min(days_ago * 0.01, 30)  # Cap at 30% extra
-                dominance = min(latest_btc_dominance + additional_dominance, 90)  # Cap at 90%
-            
-            market_data['btc_dominance'].append(dominance)
-        
-        return market_data
+    _COINGECKO_LIMITER.acquire()
+    response = _SESSION.get(url, params=params, timeout=10)
+    response.raise_for_status()
+    return orjson.loads(response.content)
+
+# Kept for existing callers of the public helper
+make_api_request = _get_json
+
+def _load_coins_list():
+    """
+    Loads the CoinGecko coin list, refreshing the on-disk copy once it is stale
     
-    except Exception as e:
-        print(f"Error fetching market data: {e}")
-        
-        # Return mock data if API fails
-        dates = pd.date_range(end=datetime.now(), periods=30, freq='D')
-        market_cap = [2.1e12 * (1 + random.uniform(-0.05, 0.05)) for _ in range(30)]
-        volume = [1.2e11 * (1 + random.uniform(-0.1, 0.1)) for _ in range(30)]
-        btc_dominance = [45 + random.uniform(-5, 5) for _ in range(30)]
-        
-        return {
-            'date': dates,
-            'market_cap': market_cap,
-            'volume': volume,
-            'btc_dominance': btc_dominance
-        }
+    Returns:
+        list: Coin dictionaries with id, symbol and name
+    """
+    try:
+        if time.time() - os.path.getmtime(COINS_LIST_CACHE_PATH) < COINS_LIST_CACHE_TTL:
+            with open(COINS_LIST_CACHE_PATH, 'rb') as cache_file:
+                return orjson.loads(cache_file.read())
+    except (OSError, ValueError):
+        # Missing or unreadable cache, fetch a fresh copy
+        pass
     
-    for i in range(retries):
-        try:
-            response = requests.get(url, params=params, headers=headers, timeout=10)
-            response.raise_for_status()
-            return response.json()
-        except requests.exceptions.RequestException as e:
-            if i == retries - 1:
-                raise
-            
-            # If rate limited, wait before retrying
-            if hasattr(e.response, 'status_code') and e.response.status_code == 429:
-                sleep_time = backoff_factor * (2 ** i) + random.uniform(0, 1)
-                time.sleep(sleep_time)
-            else:
-                raise
+    coins = _get_json(f"{COINGECKO_BASE_URL}/coins/list")
+    
+    try:
+        os.makedirs(os.path.dirname(COINS_LIST_CACHE_PATH), exist_ok=True)
+        
+        # Write to a temporary file first so readers never see a partial list
+        tmp_path = COINS_LIST_CACHE_PATH + ".tmp"
+        with open(tmp_path, 'wb') as cache_file:
+            cache_file.write(orjson.dumps(coins))
+        os.replace(tmp_path, COINS_LIST_CACHE_PATH)
+    except OSError as e:
+        print(f"Error caching coin list: {e}")
+    
+    return coins
+
+def _get_symbol_index():
+    """
+    Returns an index of upper-case token symbols to CoinGecko IDs
+    
+    Returns:
+        dict: Symbol to CoinGecko ID mapping (first listed coin wins)
+    """
+    if (_symbol_index_cache["index"] is None or
+            time.time() - _symbol_index_cache["loaded_at"] >= COINS_LIST_CACHE_TTL):
+        index = {}
+        for coin in _load_coins_list():
+            index.setdefault(coin['symbol'].upper(), coin['id'])
+        
+        _symbol_index_cache["index"] = index
+        _symbol_index_cache["loaded_at"] = time.time()
+    
+    return _symbol_index_cache["index"]
+
+def _as_series_array(entries):
+    """
+    Converts a CoinGecko [[timestamp_ms, value], ...] list to an (n, 2) float array
+    """
+    return np.asarray(entries, dtype=float).reshape(-1, 2)
+
+def _timestamps_to_dates(timestamps_ms):
+    """
+    Converts millisecond Unix timestamps to naive local datetimes
+    """
+    return pd.to_datetime(timestamps_ms, unit='ms', utc=True).tz_convert(tzlocal()).tz_localize(None)
+
+def _align_to_timestamps(timestamps, series):
+    """
+    Returns the values of series at the given timestamps, or 0 where missing
+    
+    Args:
+        timestamps (np.ndarray): Target timestamps in milliseconds
+        series (np.ndarray): (n, 2) array of timestamp/value pairs
+    
+    Returns:
+        np.ndarray: Values aligned to timestamps
+    """
+    # CoinGecko normally returns series sampled at the same timestamps
+    if len(series) == len(timestamps) and np.array_equal(series[:, 0], timestamps):
+        return series[:, 1]
+    
+    values = pd.Series(series[:, 1], index=series[:, 0])
+    values = values[~values.index.duplicated(keep='last')]
+    return values.reindex(timestamps, fill_value=0).to_numpy()
 
 def get_token_data(token, timeframe):
     """
@@ -166,37 +211,20 @@ def get_token_data(token, timeframe):
             "to": to_timestamp
         }
         
-        headers = {}
-        if COINGECKO_API_KEY:
-            headers["x-cg-pro-api-key"] = COINGECKO_API_KEY
-        
-        response = make_api_request(url, params=params, headers=headers)
+        response = _get_json(url, params=params)
         
         # Process and structure the data
+        prices = _as_series_array(response['prices'])
+        timestamps = prices[:, 0]
+        
         token_data = {
-            'date': [],
-            'price': [],
-            'market_cap': [],
-            'volume': []
+            'date': _timestamps_to_dates(timestamps),
+            'price': prices[:, 1],
+            # Extract market cap and volume data (align with price dates)
+            'market_cap': _align_to_timestamps(timestamps, _as_series_array(response['market_caps'])),
+            'volume': _align_to_timestamps(timestamps, _as_series_array(response['total_volumes']))
         }
         
-        # Extract price data
-        for price_entry in response['prices']:
-            timestamp = price_entry[0] / 1000  # Convert milliseconds to seconds
-            date = datetime.fromtimestamp(timestamp)
-            price = price_entry[1]
-            
-            token_data['date'].append(date)
-            token_data['price'].append(price)
-        
-        # Extract market cap data (align with price dates)
-        market_caps = {entry[0]: entry[1] for entry in response['market_caps']}
-        volumes = {entry[0]: entry[1] for entry in response['total_volumes']}
-        
-        for i, date_ms in enumerate([entry[0] for entry in response['prices']]):
-            token_data['market_cap'].append(market_caps.get(date_ms, 0))
-            token_data['volume'].append(volumes.get(date_ms, 0))
-        
         return token_data
     
     except Exception as e:
@@ -211,9 +239,9 @@ def get_token_data(token, timeframe):
         volume_base = 5e9 if token == "BTC" else 2e9 if token == "ETH" else 5e8
         
         # Add some randomness
-        prices = [price_base * (1 + random.uniform(-0.05, 0.05)) for _ in range(30)]
-        market_caps = [market_cap_base * (1 + random.uniform(-0.05, 0.05)) for _ in range(30)]
-        volumes = [volume_base * (1 + random.uniform(-0.1, 0.1)) for _ in range(30)]
+        prices = price_base * (1 + _RNG.uniform(-0.05, 0.05, 30))
+        market_caps = market_cap_base * (1 + _RNG.uniform(-0.05, 0.05, 30))
+        volumes = volume_base * (1 + _RNG.uniform(-0.1, 0.1, 30))
         
         return {
             'date': dates,
@@ -222,6 +250,118 @@ def get_token_data(token, timeframe):
             'volume': volumes
         }
 
+def get_tokens_data(tokens, timeframe):
+    """
+    Retrieves historical data for several tokens concurrently
+    
+    Args:
+        tokens (list): Token symbols
+        timeframe (str): Time period for data retrieval
+    
+    Returns:
+        dict: Token data keyed by token symbol, in the order given
+    """
+    tokens = list(tokens)
+    
+    if not tokens:
+        return {}
+    
+    # Requests are I/O bound, so threads sharing the pooled session overlap them
+    with ThreadPoolExecutor(max_workers=min(MAX_CONCURRENT_REQUESTS, len(tokens))) as executor:
+        results = executor.map(lambda token: get_token_data(token, timeframe), tokens)
+        return dict(zip(tokens, results))
+
+def get_tokens_markets(tokens):
+    """
+    Retrieves current price, market cap and 24h volume for several tokens at once
+    
+    Ids are comma-joined into a single /coins/markets request (one per 100
+    tokens) instead of one request per token.
+    
+    Args:
+        tokens (list): Token symbols
+    
+    Returns:
+        dict: Snapshot dicts with price, market_cap, volume and price_change_24h keyed by token symbol
+    """
+    token_ids = {}
+    for token in tokens:
+        token_id = _get_token_id(token)
+        if token_id:
+            token_ids.setdefault(token_id, token)
+    
+    if not token_ids:
+        return {}
+    
+    coingecko_config = API_CONFIG["coingecko"]
+    url = COINGECKO_BASE_URL + coingecko_config["endpoints"]["markets"]
+    batch_size = coingecko_config["max_ids_per_request"]
+    ids = list(token_ids)
+    markets = {}
+    
+    try:
+        for start in range(0, len(ids), batch_size):
+            batch = ids[start:start + batch_size]
+            response = _get_json(url, params={
+                "vs_currency": "usd",
+                "ids": ",".join(batch),
+                "per_page": batch_size
+            })
+            
+            for coin in response:
+                token = token_ids.get(coin['id'])
+                if token:
+                    markets[token] = {
+                        'price': coin.get('current_price'),
+                        'market_cap': coin.get('market_cap'),
+                        'volume': coin.get('total_volume'),
+                        'price_change_24h': coin.get('price_change_percentage_24h')
+                    }
+        
+        return markets
+    
+    except Exception as e:
+        print(f"Error fetching market snapshots: {e}")
+        return markets
+
+# Common symbol to CoinGecko ID mappings
+_SYMBOL_TO_ID = {
+    "BTC": "bitcoin",
+    "ETH": "ethereum",
+    "BNB": "binancecoin",
+    "XRP": "ripple",
+    "ADA": "cardano",
+    "SOL": "solana",
+    "DOT": "polkadot",
+    "DOGE": "dogecoin",
+    "AVAX": "avalanche-2",
+    "LINK": "chainlink",
+    "MATIC": "matic-network",
+    "LTC": "litecoin",
+    "UNI": "uniswap",
+    "ATOM": "cosmos",
+    "ETC": "ethereum-classic",
+    "XLM": "stellar",
+    "ALGO": "algorand",
+    "FIL": "filecoin",
+    "VET": "vechain",
+    "THETA": "theta-token"
+}
+
+@functools.lru_cache(maxsize=4096)
+def _lookup_token_id(symbol):
+    """
+    Resolves an upper-case symbol to its CoinGecko ID, memoized per session
+    
+    Lookup errors propagate so transient failures are not cached.
+    """
+    # Try to get from mapping
+    if symbol in _SYMBOL_TO_ID:
+        return _SYMBOL_TO_ID[symbol]
+    
+    # If not in mapping, look it up in the cached coin list
+    return _get_symbol_index().get(symbol)
+
 def _get_token_id(symbol):
     """
     Maps a token symbol to its CoinGecko ID
@@ -232,49 +372,8 @@ def _get_token_id(symbol):
     Returns:
         str: CoinGecko ID for the token
     """
-    # Common mappings
-    symbol_to_id = {
-        "BTC": "bitcoin",
-        "ETH": "ethereum",
-        "BNB": "binancecoin",
-        "XRP": "ripple",
-        "ADA": "cardano",
-        "SOL": "solana",
-        "DOT": "polkadot",
-        "DOGE": "dogecoin",
-        "AVAX": "avalanche-2",
-        "LINK": "chainlink",
-        "MATIC": "matic-network",
-        "LTC": "litecoin",
-        "UNI": "uniswap",
-        "ATOM": "cosmos",
-        "ETC": "ethereum-classic",
-        "XLM": "stellar",
-        "ALGO": "algorand",
-        "FIL": "filecoin",
-        "VET": "vechain",
-        "THETA": "theta-token"
-    }
-    
-    # Try to get from mapping
-    if symbol.upper() in symbol_to_id:
-        return symbol_to_id[symbol.upper()]
-    
     try:
-        # If not in mapping, try to fetch from API
-        url = f"{COINGECKO_BASE_URL}/coins/list"
-        headers = {}
-        if COINGECKO_API_KEY:
-            headers["x-cg-pro-api-key"] = COINGECKO_API_KEY
-        
-        response = make_api_request(url, headers=headers)
-        
-        # Find matching coin
-        for coin in response:
-            if coin['symbol'].upper() == symbol.upper():
-                return coin['id']
-        
-        return None
+        return _lookup_token_id(symbol.upper())
     
     except Exception as e:
         print(f"Error mapping token symbol to ID: {e}")
@@ -288,19 +387,8 @@ def get_token_list():
         list: List of token symbols
     """
     try:
-        # Use CoinGecko API to get list of coins
-        url = f"{COINGECKO_BASE_URL}/coins/list"
-        headers = {}
-        if COINGECKO_API_KEY:
-            headers["x-cg-pro-api-key"] = COINGECKO_API_KEY
-        
-        response = make_api_request(url, headers=headers)
-        
-        # Extract symbols
-        tokens = [coin['symbol'].upper() for coin in response]
-        
-        # Return unique tokens (some symbols might be duplicated)
-        return sorted(list(set(tokens)))
+        # Symbols are already unique in the cached index
+        return sorted(_get_symbol_index())
     
     except Exception as e:
         print(f"Error fetching token list: {e}")
@@ -353,4 +441,59 @@ def get_market_data(timeframe):
             "to": to_timestamp
         }
         
-        headers = {}
\ No newline at end of file
+        # The history and current global snapshot are independent, so overlap them
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            history_future = executor.submit(_get_json, url, params)
+            # Get volume data (requires an additional API call)
+            global_future = executor.submit(_get_json, f"{COINGECKO_BASE_URL}/global")
+            
+            response = history_future.result()
+            global_response = global_future.result()
+        
+        market_caps = _as_series_array(response['market_cap_chart']['market_cap_by_date'])
+        timestamps = market_caps[:, 0]
+        market_cap = market_caps[:, 1]
+        
+        # Fill in latest volume and add historical estimates
+        latest_volume = global_response['data']['total_volume']['usd']
+        latest_btc_dominance = global_response['data']['market_cap_percentage']['btc']
+        
+        # Simulate historical data if not available
+        volume_factor = latest_volume / market_cap[-1]
+        
+        # Estimate volume based on market cap with some random variation
+        volume = market_cap * volume_factor * _RNG.uniform(0.8, 1.2, market_cap.size)
+        volume[-1] = latest_volume
+        
+        # Estimate BTC dominance (historically higher), capped at 30% extra and 90% overall
+        days_ago = (timestamps[-1] - timestamps) // 86_400_000
+        btc_dominance = np.where(
+            days_ago == 0,
+            latest_btc_dominance,
+            np.minimum(latest_btc_dominance + np.minimum(days_ago * 0.01, 30), 90)
+        )
+        
+        market_data = {
+            'date': _timestamps_to_dates(timestamps),
+            'market_cap': market_cap,
+            'volume': volume,
+            'btc_dominance': btc_dominance
+        }
+        
+        return market_data
+    
+    except Exception as e:
+        print(f"Error fetching market data: {e}")
+        
+        # Return mock data if API fails
+        dates = pd.date_range(end=datetime.now(), periods=30, freq='D')
+        market_cap = 2.1e12 * (1 + _RNG.uniform(-0.05, 0.05, 30))
+        volume = 1.2e11 * (1 + _RNG.uniform(-0.1, 0.1, 30))
+        btc_dominance = 45 + _RNG.uniform(-5, 5, 30)
+        
+        return {
+            'date': dates,
+            'market_cap': market_cap,
+            'volume': volume,
+            'btc_dominance': btc_dominance
+        }
\ No newline at end of file
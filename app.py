@@ -1,17 +1,27 @@
 import streamlit as st
 import plotly.express as px
 import plotly.graph_objects as go
+import plotly.io as pio
 from datetime import datetime, timedelta
+import hashlib
+import numpy as np
 import pandas as pd
 
 # Import custom modules
-from api_service import get_market_data, get_token_data, get_token_list
-from data_processor import calculate_stats, process_historical_data
+from api_service import get_market_data, get_tokens_data, get_token_list
+from data_processor import calculate_stats, process_historical_data, combine_token_data, get_latest_values, get_token_frame, downcast_floats
 from ml_predictor import predict_prices
 from ai_analyzer import analyze_whitepaper
 from news_analyzer import get_trending_topics
-from database import save_data, get_historical_data
-from config import TIMEFRAMES, TOP_TOKENS
+from database import start_save_worker, get_historical_data, get_db_connection, init_database
+from page_layout import downsample_figure
+from config import TIMEFRAMES, TOP_TOKENS, UI_CONFIG
+
+# Serialize figures with orjson, which handles NumPy arrays natively
+pio.json.config.default_engine = "orjson"
+
+# Default chart height, applied by Plotly Express when each figure is built
+px.defaults.height = 600
 
 # Set page configuration
 st.set_page_config(
@@ -46,6 +56,15 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+# The coin list changes slowly, so keep it for a day
+@st.cache_data(ttl=24 * 3600)
+def load_token_list():
+    return get_token_list()
+
+@st.cache_data(ttl=24 * 3600)
+def load_token_count():
+    return len(load_token_list())
+
 # Sidebar
 st.sidebar.title("Crypto Analysis Settings")
 
@@ -55,7 +74,7 @@ timeframe = st.sidebar.selectbox("Select Time Period", TIMEFRAMES)
 
 # Token selection
 st.sidebar.subheader("Cryptocurrency Selection")
-all_tokens = get_token_list()
+all_tokens = load_token_list()
 selected_tokens = st.sidebar.multiselect(
     "Select Cryptocurrencies to Compare",
     options=all_tokens,
@@ -65,8 +84,9 @@ selected_tokens = st.sidebar.multiselect(
 # Main app layout
 st.title("Cryptocurrency Market Cap Analysis & Prediction")
 
-# Create tabs for different sections
-tabs = st.tabs([
+# Sections of the app, shown as a tab-like selector. Unlike st.tabs, only the
+# selected section's body runs on each rerun.
+tabs = [
     "📊 Market Overview", 
     "📈 Data Visualization", 
     "🔍 Statistical Analysis",
@@ -74,7 +94,8 @@ tabs = st.tabs([
     "📉 Price Prediction", 
     "🧠 Project Analysis",
     "📢 Trending Topics"
-])
+]
+active_tab = st.radio("Section", tabs, horizontal=True, label_visibility="collapsed")
 
 # Load data
 @st.cache_data(ttl=3600)
@@ -84,29 +105,84 @@ def load_market_data(period):
 
 @st.cache_data(ttl=3600)
 def load_token_data(tokens, period):
-    token_data = {}
-    for token in tokens:
-        token_data[token] = get_token_data(token, period)
+    # Fetch all tokens concurrently over the pooled session
+    token_data = get_tokens_data(tokens, period)
     return token_data
 
-# Get data
-try:
-    market_data = load_market_data(timeframe)
-    token_data = load_token_data(selected_tokens, timeframe)
+@st.cache_data(ttl=3600)
+def load_token_frames(tokens, period):
+    # Processed per-token frames at full precision, as saved to the database
+    token_data = load_token_data(tokens, period)
+    return {token: process_historical_data(data) for token, data in token_data.items()}
+
+@st.cache_data(ttl=3600)
+def load_processed_data(tokens, period):
+    # Keyed on the selection so reruns skip both hashing the raw data and reprocessing it
+    market_data = load_market_data(period)
     
     # Process data
     processed_market_data = process_historical_data(market_data)
-    processed_token_data = {token: process_historical_data(data) for token, data in token_data.items()}
     
-    # Save to database for historical record
-    save_data(processed_market_data, processed_token_data)
+    # All tokens in one long-format frame instead of a dict of frames,
+    # stored as float32 for display since it grows with the number of selected tokens
+    token_panel = downcast_floats(combine_token_data(load_token_frames(tokens, period)))
+    
+    # Latest values for every token in one groupby pass
+    latest_token_data = get_latest_values(token_panel)
+    
+    # Fingerprint of the processed data, used to skip redundant database saves
+    data_hash = hashlib.sha256()
+    for df in (processed_market_data, token_panel):
+        data_hash.update(pd.util.hash_pandas_object(df).values.tobytes())
+    
+    return processed_market_data, token_panel, latest_token_data, data_hash.hexdigest()
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def load_stats(tokens, period, token):
+    # Keyed on the selection like load_processed_data, so reruns skip rebuilding the tables
+    processed_market_data, token_panel, _, _ = load_processed_data(tokens, period)
+    
+    if token == "Total Market":
+        return calculate_stats(processed_market_data)
+    
+    return calculate_stats(get_token_frame(token_panel, token))
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def make_line_figure(df, x, y, title, labels, color=None, height=None):
+    # Reruns with unchanged data and options reuse the built, downsampled figure
+    fig = px.line(df, x=x, y=y, color=color, title=title, labels=labels, height=height)
+    
+    # Cache a plain figure holding only the downsampled points
+    return go.Figure(downsample_figure(fig))
+
+@st.cache_resource
+def get_save_queue():
+    # One background writer per server process; its connection is only used by that thread
+    init_database()
+    return start_save_worker(get_db_connection(check_same_thread=False))
+
+# Get data
+try:
+    processed_market_data, token_panel, latest_token_data, data_hash = load_processed_data(
+        selected_tokens, timeframe
+    )
+    
+    # Queue a save to database for historical record, once per change of the data,
+    # so rendering does not wait on database writes. The float64 frames are saved,
+    # not the float32 display panel.
+    if st.session_state.get('saved_data_hash') != data_hash:
+        get_save_queue().put((
+            processed_market_data,
+            load_token_frames(selected_tokens, timeframe)
+        ))
+        st.session_state['saved_data_hash'] = data_hash
     
 except Exception as e:
     st.error(f"Error loading data: {e}")
     st.stop()
 
 # Tab 1: Market Overview
-with tabs[0]:
+if active_tab == tabs[0]:
     st.header("Global Cryptocurrency Market Overview")
     
     # Market metrics in columns
@@ -117,8 +193,8 @@ with tabs[0]:
         st.metric("Total Market Cap", f"${current_market_cap:,.0f}")
     
     with col2:
-        market_cap_change = (processed_market_data['market_cap'].iloc[-1] / 
-                             processed_market_data['market_cap'].iloc[-2] - 1) * 100
+        # Period-over-period change is already computed by process_historical_data
+        market_cap_change = processed_market_data['market_cap_change'].iloc[-1]
         st.metric("24h Change", f"{market_cap_change:.2f}%", 
                   delta=f"{market_cap_change:.2f}%")
     
@@ -127,23 +203,23 @@ with tabs[0]:
         st.metric("24h Volume", f"${total_volume:,.0f}")
     
     with col4:
-        active_tokens = len(all_tokens)
+        active_tokens = load_token_count()
         st.metric("Active Cryptocurrencies", active_tokens)
     
     # Market cap over time chart
     st.subheader("Total Market Capitalization Over Time")
-    fig = px.line(
-        processed_market_data, 
+    fig = make_line_figure(
+        processed_market_data[['date', 'market_cap']], 
         x='date', 
         y='market_cap',
         title="Total Cryptocurrency Market Cap",
-        labels={"market_cap": "Market Cap (USD)", "date": "Date"}
+        labels={"market_cap": "Market Cap (USD)", "date": "Date"},
+        height=500
     )
-    fig.update_layout(height=500)
     st.plotly_chart(fig, use_container_width=True)
 
 # Tab 2: Data Visualization
-with tabs[1]:
+if active_tab == tabs[1]:
     st.header("Cryptocurrency Data Visualization")
     
     # Visualization type selection
@@ -155,35 +231,28 @@ with tabs[1]:
     if viz_type == "Line Chart":
         st.subheader("Market Cap Trends")
         
-        # Create combined dataframe for plotting
-        df_combined = pd.DataFrame({'date': processed_market_data['date'],
-                                   'Total Market': processed_market_data['market_cap']})
-        
-        for token, data in processed_token_data.items():
-            df_combined[token] = data['market_cap']
+        # Total market on top of the long-format token data, one line per Token
+        df_combined = pd.concat([
+            processed_market_data[['date', 'market_cap']].assign(Token='Total Market'),
+            token_panel[['Token', 'date', 'market_cap']]
+        ], ignore_index=True)
         
         # Multi-line chart
-        fig = px.line(
+        fig = make_line_figure(
             df_combined, 
             x='date',
-            y=df_combined.columns[1:],
+            y='market_cap',
+            color='Token',
             title="Market Cap Comparison",
-            labels={"value": "Market Cap (USD)", "date": "Date", "variable": "Cryptocurrency"}
+            labels={"market_cap": "Market Cap (USD)", "date": "Date", "Token": "Cryptocurrency"}
         )
-        fig.update_layout(height=600)
         st.plotly_chart(fig, use_container_width=True)
     
     elif viz_type == "Bar Chart":
         st.subheader("Market Cap Comparison")
         
         # Get latest data for each token
-        latest_data = {'Token': [], 'Market Cap': []}
-        
-        for token, data in processed_token_data.items():
-            latest_data['Token'].append(token)
-            latest_data['Market Cap'].append(data['market_cap'].iloc[-1])
-        
-        df_latest = pd.DataFrame(latest_data)
+        df_latest = latest_token_data[['Token', 'market_cap']].rename(columns={'market_cap': 'Market Cap'})
         df_latest = df_latest.sort_values('Market Cap', ascending=False)
         
         # Bar chart
@@ -195,20 +264,13 @@ with tabs[1]:
             color='Market Cap',
             color_continuous_scale=px.colors.sequential.Viridis
         )
-        fig.update_layout(height=600)
         st.plotly_chart(fig, use_container_width=True)
     
     elif viz_type == "Pie Chart":
         st.subheader("Market Share Distribution")
         
         # Calculate market share
-        latest_data = {'Token': [], 'Market Cap': []}
-        
-        for token, data in processed_token_data.items():
-            latest_data['Token'].append(token)
-            latest_data['Market Cap'].append(data['market_cap'].iloc[-1])
-        
-        df_latest = pd.DataFrame(latest_data)
+        df_latest = latest_token_data[['Token', 'market_cap']].rename(columns={'market_cap': 'Market Cap'})
         total_selected = df_latest['Market Cap'].sum()
         others = processed_market_data['market_cap'].iloc[-1] - total_selected
         
@@ -226,22 +288,17 @@ with tabs[1]:
             title="Market Share Distribution",
             hole=0.4
         )
-        fig.update_layout(height=600)
         st.plotly_chart(fig, use_container_width=True)
     
     else:  # Scatter Plot/Heatmap
         st.subheader("Price vs. Volume Analysis")
         
         # Create dataframe for scatter plot
-        scatter_data = {'Token': [], 'Price': [], 'Volume': [], 'Market Cap': []}
-        
-        for token, data in processed_token_data.items():
-            scatter_data['Token'].append(token)
-            scatter_data['Price'].append(data['price'].iloc[-1])
-            scatter_data['Volume'].append(data['volume'].iloc[-1])
-            scatter_data['Market Cap'].append(data['market_cap'].iloc[-1])
-        
-        df_scatter = pd.DataFrame(scatter_data)
+        df_scatter = latest_token_data[['Token', 'price', 'volume', 'market_cap']].rename(columns={
+            'price': 'Price',
+            'volume': 'Volume',
+            'market_cap': 'Market Cap'
+        })
         
         # Scatter plot
         fig = px.scatter(
@@ -256,11 +313,10 @@ with tabs[1]:
             title="Price vs. Volume (bubble size = Market Cap)",
             labels={"Price": "Price (USD, log scale)", "Volume": "24h Volume (USD, log scale)"}
         )
-        fig.update_layout(height=600)
         st.plotly_chart(fig, use_container_width=True)
 
 # Tab 3: Statistical Analysis
-with tabs[2]:
+if active_tab == tabs[2]:
     st.header("Statistical Analysis")
     
     token_for_stats = st.selectbox(
@@ -271,10 +327,10 @@ with tabs[2]:
     if token_for_stats == "Total Market":
         data_for_stats = processed_market_data
     else:
-        data_for_stats = processed_token_data[token_for_stats]
+        data_for_stats = get_token_frame(token_panel, token_for_stats)
     
-    # Calculate statistics
-    stats = calculate_stats(data_for_stats)
+    # Calculate statistics (memoized per token and selection)
+    stats = load_stats(selected_tokens, timeframe, token_for_stats)
     
     # Display statistics
     col1, col2 = st.columns(2)
@@ -290,8 +346,8 @@ with tabs[2]:
     # Volatility analysis
     st.subheader("Volatility Analysis")
     
-    fig = px.line(
-        data_for_stats,
+    fig = make_line_figure(
+        data_for_stats[['date', 'volatility']],
         x='date',
         y='volatility',
         title=f"Price Volatility for {token_for_stats}",
@@ -300,7 +356,7 @@ with tabs[2]:
     st.plotly_chart(fig, use_container_width=True)
 
 # Tab 4: Comparison
-with tabs[3]:
+if active_tab == tabs[3]:
     st.header("Cryptocurrency Comparison")
     
     # Select tokens to compare
@@ -328,25 +384,28 @@ with tabs[3]:
         column = metric_map[selected_metric]
         
         # Create dataframe for comparison
-        df_comparison = pd.DataFrame({'date': processed_market_data['date']})
+        comparison_columns = [processed_market_data['date']]
         
         # Include total market if comparing market cap
         if selected_metric == "Market Cap":
-            df_comparison['Total Market'] = processed_market_data['market_cap']
+            comparison_columns.append(processed_market_data['market_cap'].rename('Total Market'))
         
         # Add selected tokens data
-        for token in tokens_to_compare:
-            df_comparison[token] = processed_token_data[token][column]
+        comparison_columns += [
+            get_token_frame(token_panel, token)[column].rename(token) for token in tokens_to_compare
+        ]
+        
+        # Build all columns in one allocation, on the market data rows
+        df_comparison = pd.concat(comparison_columns, axis=1).reindex(processed_market_data.index)
         
         # Plot comparison
-        fig = px.line(
+        fig = make_line_figure(
             df_comparison,
             x='date',
-            y=df_comparison.columns[1:],
+            y=list(df_comparison.columns[1:]),
             title=f"{selected_metric} Comparison",
             labels={"value": selected_metric, "date": "Date", "variable": "Token"}
         )
-        fig.update_layout(height=600)
         st.plotly_chart(fig, use_container_width=True)
         
         # Calculate and display percentage change
@@ -370,33 +429,34 @@ with tabs[3]:
         else:  # All Time
             days_ago = None
         
-        # Create table data
-        pct_change_data = {'Token': []}
-        
+        # Restrict to the selected period
         if days_ago is not None:
             start_date = today - timedelta(days=days_ago)
             
-            for col in df_comparison.columns[1:]:
-                token_data = df_comparison[df_comparison['date'] >= start_date]
-                if not token_data.empty:
-                    start_value = token_data[col].iloc[0]
-                    end_value = token_data[col].iloc[-1]
-                    pct_change = ((end_value / start_value) - 1) * 100
-                    pct_change_data['Token'].append(col)
-                    pct_change_data[f'% Change ({selected_timeframe})'] = [f"{pct:.2f}%" for pct in pct_change_data.get(f'% Change ({selected_timeframe})', []) + [pct_change]]
+            # Dates are sorted, so binary search for the first row in the period
+            start_index = df_comparison['date'].searchsorted(pd.Timestamp(start_date))
+            df_period = df_comparison.iloc[start_index:]
         else:
-            for col in df_comparison.columns[1:]:
-                start_value = df_comparison[col].iloc[0]
-                end_value = df_comparison[col].iloc[-1]
-                pct_change = ((end_value / start_value) - 1) * 100
-                pct_change_data['Token'].append(col)
-                pct_change_data[f'% Change ({selected_timeframe})'] = [f"{pct:.2f}%" for pct in pct_change_data.get(f'% Change ({selected_timeframe})', []) + [pct_change]]
+            df_period = df_comparison
+        
+        # Percentage change from the first to the last row of every column at once
+        change_column = f'% Change ({selected_timeframe})'
+        values = df_period[df_comparison.columns[1:]]
+        
+        if values.empty:
+            pct_change_table = pd.DataFrame(columns=['Token', change_column])
+        else:
+            pct_change = (values.iloc[-1] / values.iloc[0] - 1) * 100
+            pct_change_table = pd.DataFrame({
+                'Token': pct_change.index,
+                change_column: pct_change.map('{:.2f}%'.format).values
+            })
         
         # Display table
-        st.table(pd.DataFrame(pct_change_data))
+        st.table(pct_change_table)
 
 # Tab 5: Price Prediction
-with tabs[4]:
+if active_tab == tabs[4]:
     st.header("Cryptocurrency Price Prediction")
     
     # Select token for prediction
@@ -425,7 +485,7 @@ with tabs[4]:
         with st.spinner(f"Generating {prediction_days} day prediction using {model_type}..."):
             try:
                 # Get historical data for the selected token
-                historical_data = processed_token_data[token_for_prediction]
+                historical_data = get_token_frame(token_panel, token_for_prediction)
                 
                 # Run prediction
                 prediction_result = predict_prices(
@@ -437,19 +497,28 @@ with tabs[4]:
                 # Display prediction chart
                 fig = go.Figure()
                 
+                # Plain NumPy arrays skip Plotly's per-trace pandas inspection
+                prediction_dates = np.asarray(prediction_result['date'], dtype='datetime64[ns]')
+                
+                # Long histories render with WebGL, like px.line does in auto render mode
+                if len(historical_data) > UI_CONFIG["webgl_point_threshold"]:
+                    line_trace = go.Scattergl
+                else:
+                    line_trace = go.Scatter
+                
                 # Add historical data
-                fig.add_trace(go.Scatter(
-                    x=historical_data['date'],
-                    y=historical_data['price'],
+                fig.add_trace(line_trace(
+                    x=historical_data['date'].to_numpy(),
+                    y=historical_data['price'].to_numpy(dtype='float32'),
                     mode='lines',
                     name='Historical Price',
                     line=dict(color='blue')
                 ))
                 
                 # Add prediction
-                fig.add_trace(go.Scatter(
-                    x=prediction_result['date'],
-                    y=prediction_result['predicted_price'],
+                fig.add_trace(line_trace(
+                    x=prediction_dates,
+                    y=np.asarray(prediction_result['predicted_price'], dtype='float32'),
                     mode='lines',
                     name='Predicted Price',
                     line=dict(color='red', dash='dash')
@@ -457,24 +526,20 @@ with tabs[4]:
                 
                 # Add confidence intervals if available
                 if 'upper_bound' in prediction_result and 'lower_bound' in prediction_result:
-                    fig.add_trace(go.Scatter(
-                        x=prediction_result['date'],
-                        y=prediction_result['upper_bound'],
-                        mode='lines',
-                        name='Upper Bound (95% CI)',
-                        line=dict(width=0),
-                        showlegend=False
-                    ))
+                    upper_bound = np.asarray(prediction_result['upper_bound'], dtype='float32')
+                    lower_bound = np.asarray(prediction_result['lower_bound'], dtype='float32')
                     
+                    # One closed polygon: along the upper bound, then back along the lower bound
                     fig.add_trace(go.Scatter(
-                        x=prediction_result['date'],
-                        y=prediction_result['lower_bound'],
+                        x=np.concatenate([prediction_dates, prediction_dates[::-1]]),
+                        y=np.concatenate([upper_bound, lower_bound[::-1]]),
                         mode='lines',
-                        name='Lower Bound (95% CI)',
+                        name='95% Confidence Interval',
                         line=dict(width=0),
-                        fill='tonexty',
+                        fill='toself',
                         fillcolor='rgba(255, 0, 0, 0.1)',
-                        showlegend=False
+                        showlegend=False,
+                        hoverinfo='skip'
                     ))
                 
                 fig.update_layout(
@@ -490,7 +555,7 @@ with tabs[4]:
                     )
                 )
                 
-                st.plotly_chart(fig, use_container_width=True)
+                st.plotly_chart(go.Figure(downsample_figure(fig)), use_container_width=True)
                 
                 # Show prediction metrics
                 st.subheader("Prediction Metrics")
@@ -499,7 +564,7 @@ with tabs[4]:
                 
                 with col1:
                     current_price = historical_data['price'].iloc[-1]
-                    predicted_price = prediction_result['predicted_price'].iloc[-1]
+                    predicted_price = prediction_result['predicted_price'][-1]
                     price_change = ((predicted_price / current_price) - 1) * 100
                     
                     st.metric(
@@ -529,8 +594,10 @@ with tabs[4]:
                 # Show detailed prediction table
                 st.subheader("Prediction Details")
                 
-                prediction_table = prediction_result[['date', 'predicted_price']].copy()
-                prediction_table.columns = ['Date', 'Predicted Price (USD)']
+                prediction_table = pd.DataFrame({
+                    'Date': prediction_result['date'],
+                    'Predicted Price (USD)': prediction_result['predicted_price']
+                })
                 
                 st.dataframe(prediction_table)
                 
@@ -538,7 +605,7 @@ with tabs[4]:
                 st.error(f"Prediction error: {e}")
 
 # Tab 6: Project Analysis
-with tabs[5]:
+if active_tab == tabs[5]:
     st.header("Cryptocurrency Project Analysis")
     
     # Project selection or custom analysis
@@ -612,7 +679,7 @@ with tabs[5]:
                     st.error(f"Analysis error: {e}")
 
 # Tab 7: Trending Topics
-with tabs[6]:
+if active_tab == tabs[6]:
     st.header("Cryptocurrency Trending Topics")
     
     # Refresh button for trending topics
@@ -634,6 +701,7 @@ with tabs[6]:
                 st.subheader("Trending Cryptocurrencies")
                 
                 trending_tokens = pd.DataFrame(trending_data['trending_tokens'])
+                trending_tokens['token'] = trending_tokens['token'].astype('category')
                 
                 fig = px.bar(
                     trending_tokens,
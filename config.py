@@ -32,10 +32,14 @@ API_CONFIG = {
             "historical_market_data": "/global/history",
             "coin_list": "/coins/list",
             "coin_data": "/coins/{id}",
-            "historical_coin_data": "/coins/{id}/market_chart/range"
+            "historical_coin_data": "/coins/{id}/market_chart/range",
+            "batch_quotes": "/simple/price",  # Up to 100 comma-joined ids per request
+            "markets": "/coins/markets"  # Up to 100 comma-joined ids per request
         },
         "request_limit": 50,  # Requests per minute (free tier)
+        "pro_request_limit": 500,  # Requests per minute (with API key)
         "retry_delay": 60,     # Seconds to wait after hitting limit
+        "max_ids_per_request": 100,  # Ids accepted by the batch endpoints
     },
     
     # CoinMarketCap API settings
@@ -69,7 +73,9 @@ API_CONFIG = {
             "top_headlines": "/top-headlines"
         },
         "request_limit": 100,  # Requests per day (developer tier)
+        "request_period": 86400,  # Seconds the request limit applies to
         "retry_delay": 86400,  # Seconds to wait after hitting limit (1 day)
+        "cache_ttl": 3600,     # Seconds a cached response is reused
     },
     
     # Crypto Panic API settings
@@ -79,7 +85,9 @@ API_CONFIG = {
             "posts": "/posts/"
         },
         "request_limit": 60,   # Requests per hour (free tier)
+        "request_period": 3600,  # Seconds the request limit applies to
         "retry_delay": 3600,   # Seconds to wait after hitting limit (1 hour)
+        "cache_ttl": 900,      # Seconds a cached response is reused
     }
 }
 
@@ -103,16 +111,25 @@ ML_CONFIG = {
         "yearly_seasonality": True,
         "weekly_seasonality": True,
         "daily_seasonality": False
+    },
+    # Fitted model files kept on disk; the least recently used are deleted beyond these limits
+    "model_cache": {
+        "max_files": 200,
+        "max_age": 7 * 24 * 3600  # Seconds
     }
 }
 
 # AI analysis configuration
 AI_CONFIG = {
-    "model": "gpt-3.5-turbo",
+    "model": "gpt-4o-mini",
     "temperature": 0.2,
-    "max_tokens": 1000,
+    "max_tokens": 350,  # Per aspect analysis
+    "summary_max_tokens": 400,
+    "request_timeout": 30,  # Seconds
     "analysis_types": ["security", "growth", "risk", "technology", "summary"],
-    "whitepaper_max_length": 15000  # Characters
+    "whitepaper_max_length": 15000,  # Characters sent with the combined analysis
+    "whitepaper_scan_length": 60000,  # Characters extracted before chunk selection
+    "aspect_context_length": 6000  # Characters sent with each per-aspect analysis
 }
 
 # Chart colors for consistency across the app
@@ -137,6 +154,8 @@ CHART_COLORS = {
 # App UI configuration
 UI_CONFIG = {
     "theme": "light",
+    "webgl_point_threshold": 1000,  # Line traces longer than this render with WebGL
+    "max_points_per_trace": 2000,  # Line traces are downsampled to this many points
     "css": """
         .main {
             background-color: #f5f5f5;
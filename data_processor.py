@@ -1,6 +1,43 @@
 import pandas as pd
 import numpy as np
-from scipy import stats
+import warnings
+from numpy.lib.stride_tricks import sliding_window_view
+
+def _rolling_mean(values, window):
+    """
+    Trailing rolling mean, NaN until the first full window (like pandas rolling)
+    """
+    result = np.full(len(values), np.nan)
+    if len(values) >= window:
+        result[window - 1:] = sliding_window_view(values, window).mean(axis=1)
+    return result
+
+def _rolling_std(values, window):
+    """
+    Trailing rolling sample standard deviation, NaN until the first full window
+    """
+    result = np.full(len(values), np.nan)
+    if len(values) >= window:
+        result[window - 1:] = sliding_window_view(values, window).std(axis=1, ddof=1)
+    return result
+
+def _backfill(values):
+    """
+    Column-wise backfill of NaNs in a 2-D float array, like DataFrame.bfill()
+    """
+    n = values.shape[0]
+    missing = np.isnan(values)
+    
+    # Index of the next valid row at or below each row (n where there is none)
+    next_valid = np.where(missing, n, np.arange(n)[:, None])
+    next_valid = np.minimum.accumulate(next_valid[::-1], axis=0)[::-1]
+    
+    filled = np.take_along_axis(values, np.minimum(next_valid, n - 1), axis=0)
+    filled[next_valid == n] = np.nan
+    return filled
+
+# Percentage and ratio columns added by process_historical_data
+DERIVED_COLUMNS = ['daily_return', 'volatility', 'market_cap_change', 'volume_to_mcap']
 
 def process_historical_data(data_dict):
     """
@@ -24,7 +61,7 @@ def process_historical_data(data_dict):
     if 'price' in df.columns:
         df['daily_return'] = df['price'].pct_change() * 100
         # Calculate rolling volatility (10-day window)
-        df['volatility'] = df['daily_return'].rolling(window=10).std()
+        df['volatility'] = _rolling_std(df['daily_return'].to_numpy(dtype=float), 10)
     
     # Calculate market cap change
     if 'market_cap' in df.columns:
@@ -37,81 +74,210 @@ def process_historical_data(data_dict):
     # Calculate 7-day and 30-day moving averages
     for col in ['price', 'market_cap', 'volume']:
         if col in df.columns:
-            df[f'{col}_7d_ma'] = df[col].rolling(window=7).mean()
-            df[f'{col}_30d_ma'] = df[col].rolling(window=30).mean()
+            values = df[col].to_numpy(dtype=float)
+            df[f'{col}_7d_ma'] = _rolling_mean(values, 7)
+            df[f'{col}_30d_ma'] = _rolling_mean(values, 30)
+    
+    # Fill NA values (rolling warm-up rows) in one pass over the numeric block
+    numeric_columns = df.select_dtypes(include='number').columns
+    df[numeric_columns] = _backfill(df[numeric_columns].to_numpy(dtype=float))
     
-    # Fill NA values
-    df = df.fillna(method='bfill')
+    # Derived display columns only need float32 precision; raw values stay float64
+    derived_columns = [col for col in df.columns if col in DERIVED_COLUMNS or col.endswith(('_7d_ma', '_30d_ma'))]
+    df = df.astype(dict.fromkeys(derived_columns, 'float32'))
     
     return df
 
-def calculate_stats(df):
+def combine_token_data(token_data_dict, columns=None):
+    """
+    Stacks per-token dataframes into one long-format dataframe
+    
+    Args:
+        token_data_dict (dict): Dictionary of processed dataframes keyed by token
+        columns (list, optional): Columns to keep from each dataframe (all if None)
+    
+    Returns:
+        pd.DataFrame: Long-format dataframe with a Token column
+    """
+    if not token_data_dict:
+        return pd.DataFrame(columns=['Token', *(columns or ['date', 'price', 'market_cap', 'volume'])])
+    
+    long_df = pd.concat(
+        {token: data if columns is None else data[list(columns)] for token, data in token_data_dict.items()},
+        names=['Token']
+    ).reset_index(level=0).reset_index(drop=True)
+    
+    # Categorical tokens store one small integer code per row and group faster
+    long_df['Token'] = pd.Categorical(long_df['Token'], categories=list(token_data_dict))
+    
+    return long_df
+
+def downcast_floats(df):
+    """
+    Converts float64 columns to float32 to halve memory and serialization size
+    
+    Args:
+        df (pd.DataFrame): Dataframe to convert
+    
+    Returns:
+        pd.DataFrame: Dataframe with float32 instead of float64 columns
+    """
+    float_columns = df.select_dtypes(include='float64').columns
+    return df.astype(dict.fromkeys(float_columns, 'float32'))
+
+def get_latest_values(long_df):
+    """
+    Gets the most recent row for every token of a long-format dataframe
+    
+    Args:
+        long_df (pd.DataFrame): Long-format dataframe sorted by date within each token
+    
+    Returns:
+        pd.DataFrame: One row per token, in token order
+    """
+    return long_df.groupby('Token', sort=False, observed=True).tail(1).reset_index(drop=True)
+
+def get_token_frame(long_df, token):
+    """
+    Gets the data of a single token from a long-format dataframe
+    
+    Args:
+        long_df (pd.DataFrame): Long-format dataframe with a Token column
+        token (str): Token symbol
+    
+    Returns:
+        pd.DataFrame: Rows of the token without the Token column
+    """
+    return long_df.loc[long_df['Token'] == token].drop(columns='Token').reset_index(drop=True)
+
+def _row_summaries(matrix):
+    """
+    NaN-aware summary statistics along each row of a 2-D array, in one pass per moment
+    
+    Skewness and kurtosis are the biased estimators, matching the scipy.stats defaults,
+    and the standard deviation uses ddof=1 like pandas.
+    
+    Args:
+        matrix (np.ndarray): (rows, n) float array, NaN-padded
+    
+    Returns:
+        dict: Arrays of mean, median, min, max, std, skew and kurtosis per row
+    """
+    with warnings.catch_warnings(), np.errstate(invalid='ignore', divide='ignore'):
+        # All-NaN rows give NaN statistics
+        warnings.simplefilter('ignore', RuntimeWarning)
+        
+        n = np.sum(~np.isnan(matrix), axis=1)
+        mean = np.nanmean(matrix, axis=1)
+        
+        # Center once and derive the second, third and fourth central moments
+        deviations = matrix - mean[:, None]
+        squared = deviations * deviations
+        m2 = np.nanmean(squared, axis=1)
+        m3 = np.nanmean(squared * deviations, axis=1)
+        m4 = np.nanmean(squared * squared, axis=1)
+        
+        flat = m2 == 0
+        
+        return {
+            'mean': mean,
+            'median': np.nanmedian(matrix, axis=1),
+            'min': np.nanmin(matrix, axis=1),
+            'max': np.nanmax(matrix, axis=1),
+            'std': np.where(n > 1, np.sqrt(m2 * n / (n - 1)), np.nan),
+            'skew': np.where(flat, np.nan, m3 / m2 ** 1.5),
+            'kurtosis': np.where(flat, np.nan, m4 / m2 ** 2 - 3)
+        }
+
+def _period_change(values, periods):
+    """
+    Percentage change from `periods` rows back (or the first row) to the last row
+    """
+    return (values[-1] / values[-min(periods, len(values))] - 1) * 100
+
+def calculate_stats(df, summaries=None):
     """
     Calculates statistical metrics for the data
     
     Args:
         df (pd.DataFrame): Processed dataframe
+        summaries (dict, optional): Precomputed column summaries from calculate_stats_batch
     
     Returns:
         dict: Dictionary with statistical measures
     """
     stats_dict = {}
+    summaries = summaries or {}
+    
+    def summarize(column, values):
+        if column in summaries:
+            return summaries[column]
+        return {name: row[0] for name, row in _row_summaries(values[None, :]).items()}
     
     # Price statistics (if available)
     if 'price' in df.columns:
+        price_values = df['price'].to_numpy(dtype=float)
+        price = summarize('price', price_values)
+        
         price_stats = pd.DataFrame({
             'Metric': [
                 'Mean', 'Median', 'Min', 'Max', 'Std Dev', 
                 'Skewness', 'Kurtosis', '7-Day Change (%)', '30-Day Change (%)'
             ],
             'Value': [
-                f"${df['price'].mean():.4f}",
-                f"${df['price'].median():.4f}",
-                f"${df['price'].min():.4f}",
-                f"${df['price'].max():.4f}",
-                f"${df['price'].std():.4f}",
-                f"{stats.skew(df['price'].dropna()):.4f}",
-                f"{stats.kurtosis(df['price'].dropna()):.4f}",
-                f"{((df['price'].iloc[-1] / df['price'].iloc[-min(7, len(df))]) - 1) * 100:.2f}%",
-                f"{((df['price'].iloc[-1] / df['price'].iloc[-min(30, len(df))]) - 1) * 100:.2f}%"
+                f"${price['mean']:.4f}",
+                f"${price['median']:.4f}",
+                f"${price['min']:.4f}",
+                f"${price['max']:.4f}",
+                f"${price['std']:.4f}",
+                f"{price['skew']:.4f}",
+                f"{price['kurtosis']:.4f}",
+                f"{_period_change(price_values, 7):.2f}%",
+                f"{_period_change(price_values, 30):.2f}%"
             ]
         })
         stats_dict['price_stats'] = price_stats.set_index('Metric')
     
     # Market cap statistics (if available)
     if 'market_cap' in df.columns:
+        market_cap_values = df['market_cap'].to_numpy(dtype=float)
+        market_cap = summarize('market_cap', market_cap_values)
+        
         market_cap_stats = pd.DataFrame({
             'Metric': [
                 'Mean', 'Median', 'Min', 'Max', 'Std Dev', 
                 '7-Day Change (%)', '30-Day Change (%)'
             ],
             'Value': [
-                f"${df['market_cap'].mean():.2e}",
-                f"${df['market_cap'].median():.2e}",
-                f"${df['market_cap'].min():.2e}",
-                f"${df['market_cap'].max():.2e}",
-                f"${df['market_cap'].std():.2e}",
-                f"{((df['market_cap'].iloc[-1] / df['market_cap'].iloc[-min(7, len(df))]) - 1) * 100:.2f}%",
-                f"{((df['market_cap'].iloc[-1] / df['market_cap'].iloc[-min(30, len(df))]) - 1) * 100:.2f}%"
+                f"${market_cap['mean']:.2e}",
+                f"${market_cap['median']:.2e}",
+                f"${market_cap['min']:.2e}",
+                f"${market_cap['max']:.2e}",
+                f"${market_cap['std']:.2e}",
+                f"{_period_change(market_cap_values, 7):.2f}%",
+                f"{_period_change(market_cap_values, 30):.2f}%"
             ]
         })
         stats_dict['market_cap_stats'] = market_cap_stats.set_index('Metric')
     
     # Volume statistics (if available)
     if 'volume' in df.columns:
+        volume_values = df['volume'].to_numpy(dtype=float)
+        volume = summarize('volume', volume_values)
+        
         volume_stats = pd.DataFrame({
             'Metric': [
                 'Mean', 'Median', 'Min', 'Max', 'Std Dev', 
                 '7-Day Change (%)', '30-Day Change (%)'
             ],
             'Value': [
-                f"${df['volume'].mean():.2e}",
-                f"${df['volume'].median():.2e}",
-                f"${df['volume'].min():.2e}",
-                f"${df['volume'].max():.2e}",
-                f"${df['volume'].std():.2e}",
-                f"{((df['volume'].iloc[-1] / df['volume'].iloc[-min(7, len(df))]) - 1) * 100:.2f}%",
-                f"{((df['volume'].iloc[-1] / df['volume'].iloc[-min(30, len(df))]) - 1) * 100:.2f}%"
+                f"${volume['mean']:.2e}",
+                f"${volume['median']:.2e}",
+                f"${volume['min']:.2e}",
+                f"${volume['max']:.2e}",
+                f"${volume['std']:.2e}",
+                f"{_period_change(volume_values, 7):.2f}%",
+                f"{_period_change(volume_values, 30):.2f}%"
             ]
         })
         stats_dict['volume_stats'] = volume_stats.set_index('Metric')
@@ -134,6 +300,104 @@ def calculate_stats(df):
     
     return stats_dict
 
+def calculate_stats_batch(token_dfs):
+    """
+    Calculates statistical metrics for several tokens at once
+    
+    Each column is stacked into one right-aligned, NaN-padded (tokens, rows)
+    array so every summary statistic is a single vectorized pass over all tokens.
+    
+    Args:
+        token_dfs (dict): Processed dataframes keyed by token
+    
+    Returns:
+        dict: calculate_stats results keyed by token
+    """
+    if not token_dfs:
+        return {}
+    
+    tokens = list(token_dfs)
+    width = max(len(df) for df in token_dfs.values())
+    summaries = {token: {} for token in tokens}
+    
+    for column in ['price', 'market_cap', 'volume']:
+        present = [token for token in tokens if column in token_dfs[token].columns]
+        if not present:
+            continue
+        
+        matrix = np.full((len(present), width), np.nan)
+        for row, token in enumerate(present):
+            values = token_dfs[token][column].to_numpy(dtype=float)
+            if len(values):
+                matrix[row, -len(values):] = values
+        
+        column_summaries = _row_summaries(matrix)
+        for row, token in enumerate(present):
+            summaries[token][column] = {name: values[row] for name, values in column_summaries.items()}
+    
+    return {token: calculate_stats(token_dfs[token], summaries[token]) for token in tokens}
+
+class CorrelationAccumulator:
+    """
+    Running sums behind a correlation matrix of append-only, fully aligned price rows
+    
+    Values are shifted by the first row before summing so the sums stay
+    numerically stable for large prices.
+    
+    Args:
+        first_date: Date of the first row
+        first_row (np.ndarray): Prices of every token on the first row
+    """
+    
+    def __init__(self, first_date, first_row):
+        self.first_date = first_date
+        self.shift = first_row.copy()
+        self.n = 0
+        self.sum_x = np.zeros(len(first_row))
+        self.sum_xy = np.zeros((len(first_row), len(first_row)))
+        self.last_date = None
+        self.last_row = None
+    
+    def extends(self, dates, rows):
+        """
+        Checks whether dates/rows start with exactly the rows already accumulated
+        
+        The latest point of a live series changes between fetches, so the last
+        accumulated row must also be unchanged.
+        """
+        return (
+            0 < self.n <= len(dates)
+            and dates[0] == self.first_date
+            and dates[self.n - 1] == self.last_date
+            and np.array_equal(rows[self.n - 1], self.last_row)
+        )
+    
+    def update(self, dates, rows):
+        """
+        Adds the rows after the ones already accumulated
+        """
+        new_rows = rows[self.n:] - self.shift
+        if len(new_rows):
+            self.n = len(rows)
+            self.sum_x += new_rows.sum(axis=0)
+            self.sum_xy += new_rows.T @ new_rows
+            self.last_date = dates[-1]
+            self.last_row = rows[-1].copy()
+    
+    def correlation(self):
+        """
+        Returns the correlation matrix of the accumulated rows
+        """
+        cov = (self.sum_xy - np.outer(self.sum_x, self.sum_x) / self.n) / (self.n - 1)
+        std = np.sqrt(np.diag(cov))
+        
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.clip(cov / np.outer(std, std), -1, 1)
+
+# Accumulators keyed by token selection, reused while new data only appends rows
+CORRELATION_CACHE_SIZE = 32
+_correlation_accumulators = {}
+
 def calculate_correlation_matrix(token_data_dict):
     """
     Calculates correlation matrix between different tokens
@@ -144,20 +408,38 @@ def calculate_correlation_matrix(token_data_dict):
     Returns:
         pd.DataFrame: Correlation matrix
     """
-    # Extract price data for each token
-    price_data = {}
+    if not token_data_dict:
+        return pd.DataFrame()
     
-    for token, data in token_data_dict.items():
-        df = pd.DataFrame(data)
-        price_data[token] = df.set_index('date')['price']
+    tokens = list(token_data_dict)
+    frames = [pd.DataFrame(data) for data in token_data_dict.values()]
     
-    # Create a combined dataframe
-    price_df = pd.DataFrame(price_data)
+    # Align every token's prices on the union of dates in one float matrix
+    token_dates = [df['date'].to_numpy() for df in frames]
+    all_dates = np.unique(np.concatenate(token_dates))
+    
+    price_matrix = np.full((len(all_dates), len(tokens)), np.nan)
+    for col, (dates, df) in enumerate(zip(token_dates, frames)):
+        price_matrix[np.searchsorted(all_dates, dates), col] = df['price'].to_numpy(dtype=float)
     
     # Calculate correlation matrix
-    corr_matrix = price_df.corr()
+    if len(all_dates) > 1 and not np.isnan(price_matrix).any():
+        # Fully aligned prices: update running sums with the rows added since the last call
+        key = tuple(tokens)
+        accumulator = _correlation_accumulators.get(key)
+        
+        if accumulator is None or not accumulator.extends(all_dates, price_matrix):
+            if len(_correlation_accumulators) >= CORRELATION_CACHE_SIZE:
+                _correlation_accumulators.clear()
+            accumulator = _correlation_accumulators[key] = CorrelationAccumulator(all_dates[0], price_matrix[0])
+        
+        accumulator.update(all_dates, price_matrix)
+        corr = accumulator.correlation()
+    else:
+        # Gaps need pairwise-complete correlations
+        corr = pd.DataFrame(price_matrix).corr().to_numpy()
     
-    return corr_matrix
+    return pd.DataFrame(corr, index=tokens, columns=tokens)
 
 def detect_outliers(df, column, threshold=3):
     """
@@ -174,15 +456,25 @@ def detect_outliers(df, column, threshold=3):
     if column not in df.columns:
         return pd.DataFrame()
     
-    # Calculate Z-scores
-    z_scores = np.abs(stats.zscore(df[column].dropna()))
+    # Calculate Z-scores on the full column so positions stay aligned with df
+    values = df[column].to_numpy(dtype=float)
+    valid = ~np.isnan(values)
+    
+    if not valid.any():
+        return pd.DataFrame()
+    
+    present = values[valid]
+    std = present.std()
     
-    # Find outliers
-    outliers_idx = np.where(z_scores > threshold)[0]
+    if std == 0:
+        return pd.DataFrame()
+    
+    with np.errstate(invalid='ignore'):
+        outliers = valid & (np.abs((values - present.mean()) / std) > threshold)
     
-    # Return dataframe with outliers
-    if len(outliers_idx) > 0:
-        return df.iloc[outliers_idx].copy()
+    # Return dataframe with outliers (boolean indexing already returns a new frame)
+    if outliers.any():
+        return df[outliers]
     else:
         return pd.DataFrame()
 
@@ -199,13 +491,20 @@ def calculate_risk_metrics(df):
     if 'price' not in df.columns or 'daily_return' not in df.columns:
         return {}
     
+    # Work on the NaN-free returns array once
+    returns = df['daily_return'].to_numpy(dtype=float)
+    returns = returns[~np.isnan(returns)]
+    
+    if returns.size == 0:
+        return {}
+    
     # Calculate risk metrics
     risk_metrics = {}
     
     # Sharpe ratio (using 2% as risk-free rate)
     risk_free_rate = 0.02 / 365  # Daily risk-free rate
-    mean_return = df['daily_return'].mean()
-    std_return = df['daily_return'].std()
+    mean_return = returns.mean()
+    std_return = returns.std(ddof=1) if returns.size > 1 else 0
     
     if std_return > 0:
         sharpe_ratio = (mean_return - risk_free_rate) / std_return
@@ -213,19 +512,18 @@ def calculate_risk_metrics(df):
     else:
         risk_metrics['sharpe_ratio'] = 0
     
-    # Maximum drawdown
-    cumulative_returns = (1 + df['daily_return'] / 100).cumprod()
-    running_max = cumulative_returns.cummax()
-    drawdown = (cumulative_returns / running_max - 1) * 100
-    max_drawdown = drawdown.min()
+    # Maximum drawdown (scaled to percent once, on the minimum)
+    cumulative_returns = np.cumprod(1 + returns / 100)
+    drawdown = cumulative_returns / np.maximum.accumulate(cumulative_returns)
+    max_drawdown = (drawdown.min() - 1) * 100
     risk_metrics['max_drawdown'] = max_drawdown
     
-    # Value at Risk (VaR) - 95% confidence
-    var_95 = np.percentile(df['daily_return'], 5)
+    # Value at Risk (VaR) - 95% confidence (np.percentile selects with a partition, not a full sort)
+    var_95 = np.percentile(returns, 5)
     risk_metrics['var_95'] = var_95
     
     # Conditional VaR (CVaR) - 95% confidence
-    cvar_95 = df['daily_return'][df['daily_return'] <= var_95].mean()
+    cvar_95 = returns[returns <= var_95].mean()
     risk_metrics['cvar_95'] = cvar_95
     
     return risk_metrics
\ No newline at end of file
@@ -1,8 +1,13 @@
 import os
 import sqlite3
+import queue
+import threading
 import pandas as pd
+import time
 from datetime import datetime
 import json
+import orjson
+import hashlib
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -17,16 +22,63 @@ DB_NAME = os.getenv("DB_NAME", "crypto_analysis")
 DB_USER = os.getenv("DB_USER", "")
 DB_PASSWORD = os.getenv("DB_PASSWORD", "")
 
-def get_db_connection():
+# External response cache policy: enabled, read-only, replay or disabled
+RESPONSE_CACHE_MODE = os.getenv("RESPONSE_CACHE_MODE", "enabled").lower()
+
+# Per-thread SQLite connection reused across calls
+_conn_local = threading.local()
+
+def _connect_sqlite(check_same_thread=True):
+    """
+    Opens the SQLite database in WAL mode so readers do not block the writer
+    """
+    conn = sqlite3.connect(DB_PATH, check_same_thread=check_same_thread)
+    
+    # WAL only needs an fsync at checkpoints, not on every commit
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    
+    # Keep temp tables in memory, map up to 256 MB and cache up to 64 MB of pages
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute("PRAGMA mmap_size=268435456")
+    conn.execute("PRAGMA cache_size=-65536")
+    
+    return conn
+
+def _get_sqlite_connection(check_same_thread=True):
+    """
+    Returns this thread's SQLite connection, opening it on first use
+    
+    Connections meant for another thread (check_same_thread=False) are
+    always opened fresh so they are never shared with the caller's thread.
+    """
+    if not check_same_thread:
+        return _connect_sqlite(check_same_thread=False)
+    
+    conn = getattr(_conn_local, "conn", None)
+    
+    if conn is None:
+        conn = _connect_sqlite()
+        _conn_local.conn = conn
+    else:
+        # Discard anything a failed caller left uncommitted
+        conn.rollback()
+    
+    return conn
+
+def get_db_connection(check_same_thread=True):
     """
     Establishes a database connection based on configuration
     
+    Args:
+        check_same_thread (bool): Restrict SQLite connections to the creating thread
+    
     Returns:
         Connection: Database connection object
     """
     if DB_TYPE.lower() == "sqlite":
-        # SQLite connection
-        return sqlite3.connect(DB_PATH)
+        # SQLite connection (reused per thread)
+        return _get_sqlite_connection(check_same_thread)
     else:
         # PostgreSQL connection
         try:
@@ -40,7 +92,41 @@ def get_db_connection():
             )
         except ImportError:
             print("Error: psycopg2 module not found. Using SQLite instead.")
-            return sqlite3.connect(DB_PATH)
+            return _get_sqlite_connection(check_same_thread)
+
+def release_db_connection(conn):
+    """
+    Closes a connection obtained from get_db_connection
+    
+    This thread's reused SQLite connection is kept open for the next call.
+    
+    Args:
+        conn (Connection): Database connection object
+    """
+    if conn is not getattr(_conn_local, "conn", None):
+        conn.close()
+
+# Epoch-second columns and the strftime modifier converting their old TEXT values:
+# price history dates are naive and stored as if UTC, save timestamps are local time
+_EPOCH_COLUMNS = [
+    ("market_data", "date", ""),
+    ("token_data", "date", ""),
+    ("analysis_results", "date", ", 'utc'"),
+    ("trending_topics", "date", ", 'utc'"),
+    ("response_cache", "created_at", ", 'utc'")
+]
+
+def _to_epoch_seconds(dates):
+    """
+    Converts naive datetimes to integer epoch seconds, as stored in the date columns
+    """
+    return (pd.to_datetime(dates) - pd.Timestamp(0)) // pd.Timedelta(seconds=1)
+
+def _format_timestamp(seconds):
+    """
+    Formats stored epoch seconds as a local date string
+    """
+    return datetime.fromtimestamp(seconds).strftime('%Y-%m-%d %H:%M:%S')
 
 def init_database():
     """
@@ -49,10 +135,19 @@ def init_database():
     conn = get_db_connection()
     cursor = conn.cursor()
     
+    # Older versions stored dates as TEXT; move those tables aside so they are recreated
+    legacy_tables = []
+    if cursor.execute("PRAGMA user_version").fetchone()[0] < 1:
+        for table, column, modifier in _EPOCH_COLUMNS:
+            table_info = cursor.execute(f"PRAGMA table_info({table})").fetchall()
+            if any(name == column and col_type.upper() == "TEXT" for _, name, col_type, *_ in table_info):
+                cursor.execute(f"ALTER TABLE {table} RENAME TO {table}_legacy")
+                legacy_tables.append((table, column, modifier, [info[1] for info in table_info]))
+    
     # Create market data table
     cursor.execute('''
     CREATE TABLE IF NOT EXISTS market_data (
-        date TEXT,
+        date INTEGER,
         market_cap REAL,
         volume REAL,
         btc_dominance REAL,
@@ -64,7 +159,7 @@ def init_database():
     cursor.execute('''
     CREATE TABLE IF NOT EXISTS token_data (
         token TEXT,
-        date TEXT,
+        date INTEGER,
         price REAL,
         market_cap REAL,
         volume REAL,
@@ -76,9 +171,9 @@ def init_database():
     cursor.execute('''
     CREATE TABLE IF NOT EXISTS analysis_results (
         token TEXT,
-        date TEXT,
+        date INTEGER,
         analysis_type TEXT,
-        result TEXT,
+        result BLOB,
         PRIMARY KEY (token, date, analysis_type)
     )
     ''')
@@ -86,57 +181,159 @@ def init_database():
     # Create trending topics table
     cursor.execute('''
     CREATE TABLE IF NOT EXISTS trending_topics (
-        date TEXT,
-        topics TEXT,
+        date INTEGER,
+        topics BLOB,
         PRIMARY KEY (date)
     )
     ''')
     
+    # Create external API response cache table
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS response_cache (
+        key TEXT,
+        provider TEXT,
+        prompt TEXT,
+        response BLOB,
+        created_at INTEGER,
+        PRIMARY KEY (key)
+    )
+    ''')
+    
+    # Copy rows from tables moved aside above, converting their dates to epoch seconds
+    for table, column, modifier, columns in legacy_tables:
+        select = ", ".join(
+            f"CAST(strftime('%s', {name}{modifier}) AS INTEGER)" if name == column else name
+            for name in columns
+        )
+        cursor.execute(
+            f"INSERT OR REPLACE INTO {table} ({', '.join(columns)}) SELECT {select} FROM {table}_legacy"
+        )
+        cursor.execute(f"DROP TABLE {table}_legacy")
+    
+    cursor.execute("PRAGMA user_version = 1")
+    
     conn.commit()
-    conn.close()
+    release_db_connection(conn)
 
-def save_data(market_data, token_data):
+def save_data(market_data, token_data, conn=None):
     """
     Saves market and token data to the database
     
     Args:
         market_data (pd.DataFrame): Market data
         token_data (dict): Dictionary of token data
+        conn (Connection, optional): Open connection to reuse instead of opening a new one
     """
     try:
-        # Initialize database if needed
-        init_database()
+        own_connection = conn is None
         
-        conn = get_db_connection()
+        if own_connection:
+            # Initialize database if needed
+            init_database()
+            
+            conn = get_db_connection()
         
-        # Save market data
-        df_market = pd.DataFrame(market_data)
+        cursor = conn.cursor()
         
-        # Convert datetime to string
-        df_market['date'] = df_market['date'].dt.strftime('%Y-%m-%d %H:%M:%S')
+        # Save market data (only the stored columns; processed frames carry extra ones)
+        df_market = pd.DataFrame(market_data)
         
-        # Insert into database
-        df_market.to_sql('market_data', conn, if_exists='append', index=False)
+        cursor.executemany(
+            "INSERT OR REPLACE INTO market_data (date, market_cap, volume, btc_dominance) VALUES (?, ?, ?, ?)",
+            zip(
+                # Convert datetime to epoch seconds
+                _to_epoch_seconds(df_market['date']).tolist(),
+                # Plain floats, since sqlite3 cannot bind NumPy scalars
+                df_market['market_cap'].astype(float).tolist(),
+                df_market['volume'].astype(float).tolist(),
+                df_market['btc_dominance'].astype(float).tolist()
+            )
+        )
         
-        # Save token data
+        # Collect token rows for a single batched insert
+        rows = []
         for token, data in token_data.items():
             df_token = pd.DataFrame(data)
-            df_token['token'] = token
-            
-            #
-            # Select only needed columns
-            df_token = df_token[['token', 'date', 'price', 'market_cap', 'volume']]
             
-            # Insert into database
-            df_token.to_sql('token_data', conn, if_exists='append', index=False)
+            rows.extend(zip(
+                [token] * len(df_token),
+                # Convert datetime to epoch seconds
+                _to_epoch_seconds(df_token['date']).tolist(),
+                # Plain floats, since sqlite3 cannot bind NumPy scalars
+                df_token['price'].astype(float).tolist(),
+                df_token['market_cap'].astype(float).tolist(),
+                df_token['volume'].astype(float).tolist()
+            ))
+        
+        # Insert all tokens in the same transaction
+        cursor.executemany(
+            "INSERT OR REPLACE INTO token_data (token, date, price, market_cap, volume) VALUES (?, ?, ?, ?, ?)",
+            rows
+        )
         
         # Commit changes
         conn.commit()
-        conn.close()
+        
+        if own_connection:
+            release_db_connection(conn)
     
     except Exception as e:
         print(f"Error saving data to database: {e}")
 
+def start_save_worker(conn=None):
+    """
+    Starts a background thread that saves queued data to the database
+    
+    Args:
+        conn (Connection, optional): Connection used only by the worker thread
+    
+    Returns:
+        queue.Queue: Queue accepting (market_data, token_data) tuples for save_data
+    """
+    save_queue = queue.Queue()
+    
+    def worker():
+        while True:
+            market_data, token_data = save_queue.get()
+            save_data(market_data, token_data, conn=conn)
+            save_queue.task_done()
+    
+    threading.Thread(target=worker, name="save-data-worker", daemon=True).start()
+    
+    return save_queue
+
+def _read_sqlite_with_duckdb(queries, params):
+    """
+    Runs read queries against the SQLite file through DuckDB's columnar scanner
+    
+    Args:
+        queries (list): SQL queries using the SQLite table names
+        params (list): Parameters shared by every query
+    
+    Returns:
+        list: One DataFrame per query, or None if duckdb or its SQLite extension is unavailable
+    """
+    try:
+        import duckdb
+    except ImportError:
+        return None
+    
+    con = duckdb.connect()
+    try:
+        db_path = DB_PATH.replace("'", "''")
+        
+        # The SQLite scanner extension is downloaded on first use and may be unavailable offline
+        try:
+            con.execute(f"ATTACH '{db_path}' AS db (TYPE SQLITE, READ_ONLY)")
+        except duckdb.Error as e:
+            print(f"Error attaching SQLite database to DuckDB: {e}")
+            return None
+        
+        con.execute("USE db")
+        return [con.execute(query, params).df() for query in queries]
+    finally:
+        con.close()
+
 def get_historical_data(start_date=None, end_date=None):
     """
     Retrieves historical data from the database
@@ -149,48 +346,47 @@ def get_historical_data(start_date=None, end_date=None):
         tuple: (market_data, token_data)
     """
     try:
-        conn = get_db_connection()
-        
         # Construct date filter
         date_filter = ""
         params = []
         
         if start_date:
             date_filter += " WHERE date >= ?"
-            params.append(start_date)
+            params.append(int(_to_epoch_seconds(pd.Series([start_date]))[0]))
         
         if end_date:
             if start_date:
                 date_filter += " AND date <= ?"
             else:
                 date_filter += " WHERE date <= ?"
-            params.append(end_date)
+            params.append(int(_to_epoch_seconds(pd.Series([end_date]))[0]))
         
-        # Query market data
+        # Market data, and every token in one pass (the (token, date) primary key serves the ordering)
         market_query = f"SELECT * FROM market_data{date_filter} ORDER BY date"
-        df_market = pd.read_sql_query(market_query, conn, params=params)
-        
-        # Convert date strings to datetime
-        df_market['date'] = pd.to_datetime(df_market['date'])
-        
-        # Query unique tokens
-        token_query = "SELECT DISTINCT token FROM token_data"
-        tokens = pd.read_sql_query(token_query, conn)['token'].tolist()
-        
-        # Query token data for each token
-        token_data = {}
-        for token in tokens:
-            token_params = [token] + params
-            token_filter = date_filter.replace("WHERE", "WHERE token = ? AND") if date_filter else " WHERE token = ?"
-            query = f"SELECT * FROM token_data{token_filter} ORDER BY date"
-            df_token = pd.read_sql_query(query, conn, params=token_params)
-            
-            # Convert date strings to datetime
-            df_token['date'] = pd.to_datetime(df_token['date'])
-            
-            token_data[token] = df_token
+        token_query = f"SELECT token, date, price, market_cap, volume FROM token_data{date_filter} ORDER BY token, date"
         
-        conn.close()
+        frames = None
+        
+        if DB_TYPE.lower() == "sqlite":
+            frames = _read_sqlite_with_duckdb([market_query, token_query], params)
+        
+        if frames is not None:
+            df_market, df_tokens = frames
+        else:
+            conn = get_db_connection()
+            df_market = pd.read_sql_query(market_query, conn, params=params)
+            df_tokens = pd.read_sql_query(token_query, conn, params=params)
+            release_db_connection(conn)
+        
+        # Convert epoch seconds to datetime
+        df_market['date'] = pd.to_datetime(df_market['date'], unit='s')
+        df_tokens['date'] = pd.to_datetime(df_tokens['date'], unit='s')
+        
+        # Split into per-token frames
+        token_data = {
+            token: df_token.reset_index(drop=True)
+            for token, df_token in df_tokens.groupby('token', sort=False)
+        }
         
         return df_market.to_dict('list'), token_data
     
@@ -198,6 +394,16 @@ def get_historical_data(start_date=None, end_date=None):
         print(f"Error retrieving historical data: {e}")
         return None, None
 
+def _loads_json(value):
+    """
+    Decodes a stored JSON value, accepting orjson BLOBs and older json.dumps TEXT rows
+    """
+    try:
+        return orjson.loads(value)
+    except orjson.JSONDecodeError:
+        # json.dumps wrote NaN/Infinity literals that orjson rejects
+        return json.loads(value)
+
 def save_analysis_result(token, analysis_type, result):
     """
     Saves analysis results to the database
@@ -214,11 +420,11 @@ def save_analysis_result(token, analysis_type, result):
         conn = get_db_connection()
         cursor = conn.cursor()
         
-        # Current date
-        current_date = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        # Current time in epoch seconds
+        current_date = int(time.time())
         
-        # Convert result to JSON
-        result_json = json.dumps(result)
+        # Convert result to JSON bytes
+        result_json = orjson.dumps(result)
         
         # Insert or replace analysis result
         cursor.execute(
@@ -228,7 +434,7 @@ def save_analysis_result(token, analysis_type, result):
         
         # Commit changes
         conn.commit()
-        conn.close()
+        release_db_connection(conn)
     
     except Exception as e:
         print(f"Error saving analysis result: {e}")
@@ -257,13 +463,13 @@ def get_analysis_result(token, analysis_type, limit=1):
         
         results = []
         for date, result_json in cursor.fetchall():
-            result = json.loads(result_json)
+            result = _loads_json(result_json)
             results.append({
-                'date': date,
+                'date': _format_timestamp(date),
                 'result': result
             })
         
-        conn.close()
+        release_db_connection(conn)
         
         return results
     
@@ -285,11 +491,11 @@ def save_trending_topics(topics_data):
         conn = get_db_connection()
         cursor = conn.cursor()
         
-        # Current date
-        current_date = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        # Current time in epoch seconds
+        current_date = int(time.time())
         
-        # Convert topics to JSON
-        topics_json = json.dumps(topics_data)
+        # Convert topics to JSON bytes
+        topics_json = orjson.dumps(topics_data)
         
         # Insert or replace trending topics
         cursor.execute(
@@ -299,7 +505,7 @@ def save_trending_topics(topics_data):
         
         # Commit changes
         conn.commit()
-        conn.close()
+        release_db_connection(conn)
     
     except Exception as e:
         print(f"Error saving trending topics: {e}")
@@ -326,19 +532,136 @@ def get_trending_topics(limit=1):
         
         results = []
         for date, topics_json in cursor.fetchall():
-            topics = json.loads(topics_json)
+            topics = _loads_json(topics_json)
             results.append({
-                'date': date,
+                'date': _format_timestamp(date),
                 'topics': topics
             })
         
-        conn.close()
+        release_db_connection(conn)
         
         return results
     
     except Exception as e:
         print(f"Error retrieving trending topics: {e}")
-        return [] Convert datetime to string
-            df_token['date'] = df_token['date'].dt.strftime('%Y-%m-%d %H:%M:%S')
-            
-            #
\ No newline at end of file
+        return []
+
+def response_cache_key(provider, payload):
+    """
+    Builds a deterministic cache key for an external API request
+    
+    Args:
+        provider (str): API provider name (e.g., 'newsapi')
+        payload (dict): Everything that determines the response (model, prompt, query params, ...)
+    
+    Returns:
+        str: SHA256 hex digest of the provider and canonical JSON payload
+    """
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(f"{provider}\n{canonical}".encode("utf-8")).hexdigest()
+
+def get_cached_response(key, max_age=None):
+    """
+    Retrieves a cached API response
+    
+    Args:
+        key (str): Cache key from response_cache_key
+        max_age (int, optional): Ignore entries older than this many seconds
+    
+    Returns:
+        Decoded response, or None on a cache miss
+    """
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        
+        query = "SELECT response FROM response_cache WHERE key = ?"
+        params = [key]
+        
+        if max_age is not None:
+            query += " AND created_at >= ?"
+            params.append(int(time.time()) - max_age)
+        
+        cursor.execute(query, params)
+        row = cursor.fetchone()
+        release_db_connection(conn)
+        
+        return _loads_json(row[0]) if row else None
+    
+    except Exception as e:
+        print(f"Error reading cached response: {e}")
+        return None
+
+def save_cached_response(key, provider, prompt, response):
+    """
+    Saves an API response to the cache
+    
+    Args:
+        key (str): Cache key from response_cache_key
+        provider (str): API provider name
+        prompt (str): Canonical request payload, kept for inspection
+        response: JSON-serializable response
+    """
+    try:
+        # Initialize database if needed
+        init_database()
+        
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        
+        # Current time in epoch seconds
+        current_date = int(time.time())
+        
+        cursor.execute(
+            "INSERT OR REPLACE INTO response_cache (key, provider, prompt, response, created_at) VALUES (?, ?, ?, ?, ?)",
+            (key, provider, prompt, orjson.dumps(response), current_date)
+        )
+        
+        # Commit changes
+        conn.commit()
+        release_db_connection(conn)
+    
+    except Exception as e:
+        print(f"Error saving cached response: {e}")
+
+def cached_call(provider, payload, fetch, max_age=None):
+    """
+    Returns a cached response for payload, calling fetch on a miss
+    
+    The policy comes from RESPONSE_CACHE_MODE:
+    enabled reads and writes the cache, read-only never writes it,
+    replay never calls fetch (a miss raises LookupError) and ignores max_age,
+    and disabled always calls fetch.
+    
+    Args:
+        provider (str): API provider name
+        payload (dict): Everything that determines the response
+        fetch (callable): Performs the real request and returns a JSON-serializable response
+        max_age (int, optional): Refetch entries older than this many seconds
+    
+    Returns:
+        Cached or freshly fetched response
+    """
+    if RESPONSE_CACHE_MODE == "disabled":
+        return fetch()
+    
+    key = response_cache_key(provider, payload)
+    replay = RESPONSE_CACHE_MODE == "replay"
+    
+    cached = get_cached_response(key, max_age=None if replay else max_age)
+    if cached is not None:
+        return cached
+    
+    if replay:
+        raise LookupError(f"No cached {provider} response in replay mode")
+    
+    response = fetch()
+    
+    if RESPONSE_CACHE_MODE == "enabled":
+        save_cached_response(
+            key, provider,
+            json.dumps(payload, sort_keys=True, default=str),
+            response
+        )
+    
+    return response
\ No newline at end of file
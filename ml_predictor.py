@@ -1,12 +1,309 @@
 import pandas as pd
 import numpy as np
-from datetime import datetime, timedelta
+import os
+import hashlib
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from numpy.lib.stride_tricks import sliding_window_view
 from statsmodels.tsa.arima.model import ARIMA
 import tensorflow as tf
 from tensorflow.keras.models import Sequential
 from tensorflow.keras.layers import LSTM, Dense, Dropout
-from tensorflow.keras.preprocessing.sequence import TimeseriesGenerator
 from prophet import Prophet
+from prophet.serialize import model_to_json, model_from_json
+from config import ML_CONFIG
+try:
+    import onnxruntime
+    import tf2onnx
+except ImportError:
+    onnxruntime = None
+    tf2onnx = None
+
+# Fitted models are cached on disk, keyed by a hash of their training data and settings
+MODEL_CACHE_DIR = os.getenv("MODEL_CACHE_DIR", os.path.join("data", "models"))
+MODEL_CACHE_MAX_FILES = ML_CONFIG["model_cache"]["max_files"]
+MODEL_CACHE_MAX_AGE = ML_CONFIG["model_cache"]["max_age"]
+
+# Weights of the first LSTM trained in this process per input shape; models for
+# other price histories start from them and are only fine-tuned
+LSTM_FINE_TUNE_EPOCHS = 5
+_lstm_warm_weights = {}
+
+# Traced LSTM forecast loops by model cache path, so repeated forecasts reuse the graph
+LSTM_FORECASTER_CACHE_SIZE = 16
+_lstm_forecasters = {}
+
+# Fitted Prophet models kept in memory by cache path, so repeated forecasts
+# in one process skip deserializing the JSON model as well
+PROPHET_MEMORY_CACHE_SIZE = 16
+_prophet_models = {}
+
+def _model_cache_path(kind, arrays, params, extension):
+    """
+    Returns the cache file path of a model fitted on the given data and settings
+    
+    Args:
+        kind (str): Model type, used as the file name prefix
+        arrays (list): Training data arrays
+        params (dict): Model settings that change the fitted model
+        extension (str): File extension
+    
+    Returns:
+        str: Path inside MODEL_CACHE_DIR
+    """
+    digest = hashlib.sha256()
+    for array in arrays:
+        digest.update(np.ascontiguousarray(array).tobytes())
+    digest.update(repr(sorted(params.items())).encode())
+    
+    return os.path.join(MODEL_CACHE_DIR, f"{kind}_{digest.hexdigest()}{extension}")
+
+def _save_atomically(path, save):
+    """
+    Saves to a temporary file and renames it into place, so concurrent
+    sessions never read a partially written model
+    
+    Args:
+        path (str): Final file path
+        save (callable): Writes the model to the path it is given
+    """
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        root, extension = os.path.splitext(path)
+        temp_path = f"{root}.{os.getpid()}.{threading.get_ident()}.tmp{extension}"
+        save(temp_path)
+        os.replace(temp_path, path)
+    except Exception as e:
+        print(f"Error caching fitted model: {e}")
+        return
+    
+    _prune_model_cache(keep=path)
+
+def _mark_used(path):
+    """
+    Refreshes a cached model file's modification time, so pruning removes
+    the least recently used files first
+    """
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+def _prune_model_cache(keep=None):
+    """
+    Deletes cached model files unused for MODEL_CACHE_MAX_AGE seconds, then
+    the least recently used ones beyond MODEL_CACHE_MAX_FILES
+    
+    Price histories change with every data refresh, so most cache entries are
+    never read again and the directory would otherwise grow without bound.
+    
+    Args:
+        keep (str, optional): File never deleted, such as the one just saved
+    """
+    try:
+        entries = []
+        for entry in os.scandir(MODEL_CACHE_DIR):
+            # Temporary files belong to saves still in progress
+            if entry.is_file() and ".tmp" not in entry.name and entry.path != keep:
+                entries.append((entry.stat().st_mtime, entry.path))
+    except OSError as e:
+        print(f"Error listing model cache: {e}")
+        return
+    
+    entries.sort(reverse=True)
+    cutoff = time.time() - MODEL_CACHE_MAX_AGE
+    max_others = MODEL_CACHE_MAX_FILES - (1 if keep else 0)
+    
+    for rank, (mtime, path) in enumerate(entries):
+        if rank >= max_others or mtime < cutoff:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+def _lstm_interpreter(model, cache_path):
+    """
+    Returns a TFLite interpreter running a dynamic-range quantized copy of the model
+    
+    Weights are stored as int8, which halves the bytes read per forecast step.
+    The converted model is cached next to the Keras model.
+    
+    Args:
+        model (tf.keras.Model): Trained LSTM model
+        cache_path (str): Path of the cached Keras model
+    
+    Returns:
+        tf.lite.Interpreter: Allocated interpreter, or None if conversion fails
+    """
+    tflite_path = os.path.splitext(cache_path)[0] + ".tflite"
+    
+    try:
+        if os.path.exists(tflite_path):
+            with open(tflite_path, "rb") as f:
+                tflite_model = f.read()
+            _mark_used(tflite_path)
+        else:
+            converter = tf.lite.TFLiteConverter.from_keras_model(model)
+            converter.optimizations = [tf.lite.Optimize.DEFAULT]
+            tflite_model = converter.convert()
+            
+            def save(path):
+                with open(path, "wb") as f:
+                    f.write(tflite_model)
+            
+            _save_atomically(tflite_path, save)
+        
+        interpreter = tf.lite.Interpreter(model_content=tflite_model)
+        interpreter.allocate_tensors()
+        return interpreter
+    except Exception as e:
+        print(f"Error converting LSTM model to TFLite: {e}")
+        return None
+
+def _lstm_onnx_session(model, cache_path):
+    """
+    Returns an ONNX Runtime session running the model with full graph optimizations
+    
+    The exported model is cached next to the Keras model.
+    
+    Args:
+        model (tf.keras.Model): Trained LSTM model
+        cache_path (str): Path of the cached Keras model
+    
+    Returns:
+        onnxruntime.InferenceSession: CPU session, or None if ONNX Runtime is
+        not installed or the export fails
+    """
+    if onnxruntime is None or tf2onnx is None:
+        return None
+    
+    onnx_path = os.path.splitext(cache_path)[0] + ".onnx"
+    
+    try:
+        if os.path.exists(onnx_path):
+            with open(onnx_path, "rb") as f:
+                onnx_model = f.read()
+            _mark_used(onnx_path)
+        else:
+            input_signature = (tf.TensorSpec((1,) + tuple(model.input_shape[1:]), tf.float32, name="input"),)
+            onnx_model = tf2onnx.convert.from_keras(model, input_signature=input_signature, opset=17)[0].SerializeToString()
+            
+            def save(path):
+                with open(path, "wb") as f:
+                    f.write(onnx_model)
+            
+            _save_atomically(onnx_path, save)
+        
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        return onnxruntime.InferenceSession(onnx_model, options, providers=["CPUExecutionProvider"])
+    except Exception as e:
+        print(f"Error exporting LSTM model to ONNX: {e}")
+        return None
+
+def _lstm_step_function(model, cache_path):
+    """
+    Returns a function predicting the next normalized price from one input window
+    
+    ONNX Runtime is used when installed, otherwise the quantized TFLite model.
+    
+    Args:
+        model (tf.keras.Model): Trained LSTM model
+        cache_path (str): Path of the cached Keras model
+    
+    Returns:
+        callable: Maps a (1, n_input, 1) float32 window to a float, or None if
+        neither runtime is usable
+    """
+    session = _lstm_onnx_session(model, cache_path)
+    
+    if session is not None:
+        input_name = session.get_inputs()[0].name
+        return lambda window: session.run(None, {input_name: window})[0][0, 0]
+    
+    interpreter = _lstm_interpreter(model, cache_path)
+    
+    if interpreter is not None:
+        input_index = interpreter.get_input_details()[0]["index"]
+        output_index = interpreter.get_output_details()[0]["index"]
+        
+        def predict_next(window):
+            interpreter.set_tensor(input_index, window)
+            interpreter.invoke()
+            return interpreter.get_tensor(output_index)[0, 0]
+        
+        return predict_next
+    
+    return None
+
+def _lstm_graph_forecaster(model, cache_path):
+    """
+    Returns the traced forecast loop of a model, building it once per cached model
+    
+    The input signature fixes the window shape and takes the horizon as a
+    tensor, so the graph is traced once and reused for every horizon.
+    
+    Args:
+        model (tf.keras.Model): Trained LSTM model
+        cache_path (str): Path of the cached Keras model, identifying its weights
+    
+    Returns:
+        tf.function: Maps (window, prediction_days) to normalized predictions
+    """
+    forecast = _lstm_forecasters.get(cache_path)
+    if forecast is not None:
+        return forecast
+    
+    # Predict one day at a time and use that prediction for subsequent days.
+    # The whole loop is traced into one graph, so each step is a direct model
+    # call instead of a model.predict dispatch.
+    @tf.function(input_signature=[
+        tf.TensorSpec((1,) + tuple(model.input_shape[1:]), tf.float32),
+        tf.TensorSpec((), tf.int32)
+    ])
+    def forecast(sequence, prediction_days):
+        predictions = tf.TensorArray(tf.float32, size=prediction_days)
+        
+        for day in tf.range(prediction_days):
+            # Predict next value
+            next_value = model(sequence, training=False)
+            predictions = predictions.write(day, next_value[0, 0])
+            
+            # Slide the window: drop the oldest value and append the prediction
+            sequence = tf.concat([sequence[:, 1:, :], next_value[:, None, :]], axis=1)
+        
+        return predictions.stack()
+    
+    if len(_lstm_forecasters) >= LSTM_FORECASTER_CACHE_SIZE:
+        _lstm_forecasters.clear()
+    _lstm_forecasters[cache_path] = forecast
+    
+    return forecast
+
+def _forecast_autoregressive(predict_next, sequence, prediction_days):
+    """
+    Predicts one day at a time, feeding each prediction back into the input window
+    
+    Args:
+        predict_next (callable): Predicts the next value from a (1, n_input, 1) window
+        sequence (np.ndarray): Last normalized input window
+        prediction_days (int): Number of days to predict
+    
+    Returns:
+        np.ndarray: Normalized predictions
+    """
+    window = np.asarray(sequence, dtype=np.float32).reshape((1, -1, 1)).copy()
+    predictions = np.empty(prediction_days, dtype=np.float32)
+    
+    for day in range(prediction_days):
+        predictions[day] = predict_next(window)
+        
+        # Slide the window: drop the oldest value and append the prediction
+        window[0, :-1, 0] = window[0, 1:, 0]
+        window[0, -1, 0] = predictions[day]
+    
+    return predictions
 
 def predict_prices(historical_data, model_type, prediction_days=30):
     """
@@ -57,23 +354,22 @@ def predict_with_arima(historical_data, prediction_days=30):
     model = ARIMA(prices, order=(5, 1, 0))
     model_fit = model.fit()
     
-    # Make prediction
-    forecast = model_fit.forecast(steps=prediction_days)
+    # Make prediction with 95% confidence intervals in one forecast pass
+    forecast_result = model_fit.get_forecast(steps=prediction_days)
+    forecast = np.asarray(forecast_result.predicted_mean)
+    confidence_interval = np.asarray(forecast_result.conf_int(alpha=0.05))
     
     # Create forecast dates
     last_date = df['date'].iloc[-1]
-    forecast_dates = [last_date + timedelta(days=i+1) for i in range(prediction_days)]
-    
-    # Prepare confidence intervals
-    forecast_std = np.sqrt(model_fit.forecast_variance(prediction_days))
-    lower_bound = forecast - 1.96 * forecast_std
-    upper_bound = forecast + 1.96 * forecast_std
+    forecast_dates = pd.date_range(last_date + pd.Timedelta(days=1), periods=prediction_days, freq='D')
     
     # Ensure no negative prices
-    lower_bound = np.maximum(lower_bound, 0)
+    lower_bound = np.maximum(confidence_interval[:, 0], 0)
+    upper_bound = confidence_interval[:, 1]
     
-    # Calculate model accuracy (MAPE on historical data)
-    predictions = model_fit.predict(start=1, end=len(prices))
+    # Calculate model accuracy (MAPE on historical data), reusing the fitted
+    # in-sample predictions instead of running the filter again
+    predictions = np.asarray(model_fit.fittedvalues)[1:]
     mape = np.mean(np.abs((prices[1:] - predictions) / prices[1:])) * 100
     accuracy = 100 - mape
     
@@ -109,71 +405,110 @@ def predict_with_lstm(historical_data, prediction_days=30):
     df = df.sort_values('date')
     
     # Prepare data for LSTM
-    prices = df['price'].values
+    prices = np.asarray(df['price'].values, dtype=np.float32)
     
     # Normalize the data
-    min_price = min(prices)
-    max_price = max(prices)
-    prices_normalized = (prices - min_price) / (max_price - min_price)
+    min_price, max_price = float(prices.min()), float(prices.max())
+    scale = max_price - min_price
+    prices_normalized = (prices - min_price) / scale
     
     # Create sequences for LSTM
     n_input = 14  # Input sequence length
     n_features = 1  # Number of features (only price)
-    
-    # Prepare sequences
-    generator = TimeseriesGenerator(
-        prices_normalized,
-        prices_normalized,
-        length=n_input,
-        batch_size=1
+    batch_size = 64
+    
+    # Prepare sequences: each window of n_input prices predicts the next price.
+    # The windows are views over one array, and tf.data shuffles, batches and
+    # prefetches them without going through Python per sample.
+    windows = sliding_window_view(prices_normalized[:-1], n_input)[..., None]
+    targets = prices_normalized[n_input:]
+    dataset = (
+        tf.data.Dataset.from_tensor_slices((windows, targets))
+        .shuffle(1024)
+        .batch(batch_size)
+        .prefetch(tf.data.AUTOTUNE)
     )
     
-    # Build LSTM model
-    model = Sequential([
-        LSTM(units=50, activation='relu', return_sequences=True, input_shape=(n_input, n_features)),
-        Dropout(0.2),
-        LSTM(units=50, activation='relu'),
-        Dropout(0.2),
-        Dense(units=1)
-    ])
+    # Reuse a model already trained on the same prices and settings. Without a
+    # fully trained one, a model fine-tuned from this process's warm weights is
+    # cached under a key that includes those starting weights and its epoch count.
+    lstm_params = {"n_input": n_input, "units": 50, "dropout": 0.2, "epochs": 50, "batch_size": batch_size}
+    full_cache_path = _model_cache_path("lstm", [prices_normalized], lstm_params, ".keras")
+    warm_weights = _lstm_warm_weights.get((n_input, n_features))
     
-    model.compile(optimizer='adam', loss='mse')
-    
-    # Train model
-    model.fit(generator, epochs=50, verbose=0)
+    if warm_weights is None or os.path.exists(full_cache_path):
+        warm_weights = None
+        cache_path = full_cache_path
+    else:
+        cache_path = _model_cache_path(
+            "lstm", [prices_normalized, *warm_weights],
+            {**lstm_params, "epochs": LSTM_FINE_TUNE_EPOCHS, "warm_start": True},
+            ".keras"
+        )
+    
+    model = None
+    
+    if os.path.exists(cache_path):
+        try:
+            model = tf.keras.models.load_model(cache_path)
+            _mark_used(cache_path)
+        except Exception as e:
+            print(f"Error loading cached LSTM model: {e}")
+    
+    if model is None:
+        # Build LSTM model. The default tanh/sigmoid activations without unrolling
+        # let Keras use the fused cuDNN kernel on GPU (and the fused oneDNN path on CPU);
+        # dropout stays in separate layers so it does not disable the fused kernel.
+        model = Sequential([
+            LSTM(units=50, activation='tanh', recurrent_activation='sigmoid', unroll=False,
+                 return_sequences=True, input_shape=(n_input, n_features)),
+            Dropout(0.2),
+            LSTM(units=50, activation='tanh', recurrent_activation='sigmoid', unroll=False),
+            Dropout(0.2),
+            Dense(units=1)
+        ])
+        
+        model.compile(optimizer='adam', loss='mse')
+        
+        # Train model, or fine-tune from weights already trained on another history
+        if warm_weights is not None:
+            model.set_weights(warm_weights)
+            model.fit(dataset, epochs=LSTM_FINE_TUNE_EPOCHS, verbose=0)
+        else:
+            model.fit(dataset, epochs=50, verbose=0)
+        
+        _save_atomically(cache_path, model.save)
     
-    # Make prediction
-    last_sequence = prices_normalized[-n_input:].reshape((1, n_input, n_features))
+    _lstm_warm_weights.setdefault((n_input, n_features), model.get_weights())
     
-    # Predict one day at a time and use that prediction for subsequent days
-    predicted_normalized = []
-    current_sequence = last_sequence[0].tolist()
+    # Make prediction with ONNX Runtime or the quantized TFLite model when available
+    predict_next = _lstm_step_function(model, cache_path)
     
-    for _ in range(prediction_days):
-        # Reshape for prediction
-        current_sequence_array = np.array(current_sequence).reshape((1, n_input, n_features))
-        
-        # Predict next value
-        next_value = model.predict(current_sequence_array, verbose=0)[0][0]
+    if predict_next is not None:
+        predicted_normalized = _forecast_autoregressive(
+            predict_next, prices_normalized[-n_input:], prediction_days
+        )
+    else:
+        last_sequence = tf.constant(
+            prices_normalized[-n_input:].reshape((1, n_input, n_features)),
+            dtype=tf.float32
+        )
         
-        # Add to predictions
-        predicted_normalized.append(next_value)
+        forecast = _lstm_graph_forecaster(model, cache_path)
         
-        # Update sequence for next prediction
-        current_sequence.pop(0)
-        current_sequence.append([next_value])
+        predicted_normalized = forecast(last_sequence, tf.constant(prediction_days, dtype=tf.int32)).numpy()
     
     # Denormalize predictions
-    predicted_prices = [(p * (max_price - min_price)) + min_price for p in predicted_normalized]
+    predicted_prices = np.asarray(predicted_normalized, dtype=np.float32) * scale + min_price
     
     # Create forecast dates
     last_date = df['date'].iloc[-1]
-    forecast_dates = [last_date + timedelta(days=i+1) for i in range(prediction_days)]
+    forecast_dates = pd.date_range(last_date + pd.Timedelta(days=1), periods=prediction_days, freq='D')
     
     # Add uncertainty bounds (simple approach)
     uncertainty = 0.1  # 10% uncertainty
-    upper_bound = [p * (1 + uncertainty) for p in predicted_prices]
-    lower_bound = [p * (1 - uncertainty) for p in predicted_prices]
+    upper_bound = predicted_prices * (1 + uncertainty)
+    lower_bound = predicted_prices * (1 - uncertainty)
     
     # Prepare result
     result = {
@@ -208,25 +543,63 @@ def predict_with_prophet(historical_data, prediction_days=30):
     # Prepare data for Prophet
     prophet_df = df[['date', 'price']].rename(columns={'date': 'ds', 'price': 'y'})
     
-    # Create and fit model
-    model = Prophet(
-        changepoint_prior_scale=0.05,
-        yearly_seasonality=True,
-        weekly_seasonality=True,
-        daily_seasonality=False,
-        seasonality_mode='multiplicative'
+    # Prophet settings; any change here also changes the cache key.
+    # 100 uncertainty samples (default 1000) only coarsen the bounds, not yhat,
+    # and shorter histories get fewer potential changepoints. Crypto trades
+    # around the clock, so there is no weekly effect worth fitting.
+    prophet_params = {
+        "stan_backend": 'CMDSTANPY',
+        "changepoint_prior_scale": 0.05,
+        "yearly_seasonality": True,
+        "weekly_seasonality": False,
+        "daily_seasonality": False,
+        "seasonality_mode": 'multiplicative',
+        "n_changepoints": 15 if len(prophet_df) < 365 else 25,
+        "mcmc_samples": 0,
+        "uncertainty_samples": 100
+    }
+    
+    # Reuse a model already fitted on the same history and settings
+    cache_path = _model_cache_path(
+        "prophet",
+        [prophet_df['ds'].to_numpy(dtype='datetime64[ns]'), prophet_df['y'].to_numpy(dtype=float)],
+        prophet_params,
+        ".json"
     )
+    model = _prophet_models.get(cache_path)
+    
+    if model is None and os.path.exists(cache_path):
+        try:
+            with open(cache_path, "r") as f:
+                model = model_from_json(f.read())
+            _mark_used(cache_path)
+        except Exception as e:
+            print(f"Error loading cached Prophet model: {e}")
+    
+    if model is None:
+        # Create and fit model
+        model = Prophet(**prophet_params)
+        model.fit(prophet_df)
+        
+        def save_prophet(path):
+            with open(path, "w") as f:
+                f.write(model_to_json(model))
+        
+        _save_atomically(cache_path, save_prophet)
     
-    model.fit(prophet_df)
+    if len(_prophet_models) >= PROPHET_MEMORY_CACHE_SIZE:
+        _prophet_models.clear()
+    _prophet_models[cache_path] = model
     
-    # Create future dataframe
-    future = model.make_future_dataframe(periods=prediction_days)
+    # Create future dataframe holding only the days to predict, so the
+    # history is not predicted again just to be sliced off
+    last_date = pd.to_datetime(prophet_df['ds']).max()
+    future = pd.DataFrame({
+        'ds': pd.date_range(last_date + pd.Timedelta(days=1), periods=prediction_days, freq='D')
+    })
     
     # Make prediction
-    forecast = model.predict(future)
-    
-    # Extract relevant prediction period
-    forecast = forecast.iloc[-prediction_days:].reset_index(drop=True)
+    forecast = model.predict(future).reset_index(drop=True)
     
     # Prepare result
     result = {
@@ -236,4 +609,31 @@ def predict_with_prophet(historical_data, prediction_days=30):
         'lower_bound': forecast['yhat_lower'].values
     }
     
-    return result
\ No newline at end of file
+    return result
+
+def predict_many_with_prophet(series_dict, prediction_days=30):
+    """
+    Predicts future prices for several tokens with Prophet in parallel
+    
+    Each Stan fit is single-threaded and the series are independent, so
+    fits run in separate processes to use every CPU core.
+    
+    Args:
+        series_dict (dict): Historical price data keyed by token
+        prediction_days (int): Number of days to predict
+    
+    Returns:
+        dict: Prediction results keyed by token
+    """
+    if not series_dict:
+        return {}
+    
+    tokens = list(series_dict)
+    
+    with ProcessPoolExecutor(max_workers=min(len(tokens), os.cpu_count() or 1)) as executor:
+        results = executor.map(
+            predict_with_prophet,
+            [series_dict[token] for token in tokens],
+            [prediction_days] * len(tokens)
+        )
+        return dict(zip(tokens, results))
\ No newline at end of file
@@ -1,10 +1,22 @@
 import os
 import requests
-import random
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import heapq
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 import pandas as pd
+import numpy as np
 import json
 from dotenv import load_dotenv
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+from config import API_CONFIG
+from database import cached_call
+from rate_limit import get_limiter
 
 # Load environment variables
 load_dotenv()
@@ -13,6 +25,110 @@ load_dotenv()
 NEWS_API_KEY = os.getenv("NEWS_API_KEY", "")
 CRYPTO_PANIC_API_KEY = os.getenv("CRYPTO_PANIC_API_KEY", "")
 
+# Shared HTTP session so news API calls reuse pooled keep-alive connections
+_SESSION = requests.Session()
+_SESSION.mount("https://", HTTPAdapter(
+    pool_connections=10,
+    pool_maxsize=10,
+    max_retries=Retry(
+        total=3,
+        backoff_factor=0.3,
+        status_forcelist=[500, 502, 503, 504]
+    )
+))
+_SESSION.headers.update({"Accept-Encoding": "gzip"})
+
+# Common cryptocurrency tokens
+COMMON_TOKENS = {
+    "BTC": "Bitcoin",
+    "ETH": "Ethereum",
+    "BNB": "Binance Coin",
+    "SOL": "Solana",
+    "XRP": "XRP",
+    "ADA": "Cardano",
+    "DOGE": "Dogecoin",
+    "SHIB": "Shiba Inu",
+    "MATIC": "Polygon",
+    "DOT": "Polkadot",
+    "LINK": "Chainlink",
+    "ATOM": "Cosmos",
+    "AVAX": "Avalanche",
+    "LTC": "Litecoin",
+    "UNI": "Uniswap"
+}
+
+# Simple sentiment words
+POSITIVE_WORDS = [
+    "bullish", "surge", "soar", "gain", "rally", "climb", "rise", "positive",
+    "breakthrough", "adoption", "partnership", "success", "growth", "profit",
+    "innovation", "potential", "opportunity", "promising", "optimistic", "victory"
+]
+
+NEGATIVE_WORDS = [
+    "bearish", "plunge", "crash", "drop", "fall", "decline", "negative", "bearish",
+    "setback", "concern", "problem", "issue", "risk", "loss", "trouble", "danger",
+    "warning", "collapse", "downtrend", "pessimistic", "defeat"
+]
+
+def _build_keyword_patterns():
+    """
+    Maps each lowercase keyword to its (sentiment weight, tokens it mentions)
+    """
+    weights = {}
+    tokens = {}
+    
+    # Words listed twice count twice, as separate list entries always have
+    for word in POSITIVE_WORDS:
+        weights[word] = weights.get(word, 0) + 0.1
+    for word in NEGATIVE_WORDS:
+        weights[word] = weights.get(word, 0) - 0.1
+    
+    for token, name in COMMON_TOKENS.items():
+        for pattern in (token.lower(), name.lower()):
+            tokens.setdefault(pattern, set()).add(token)
+    
+    return {
+        pattern: (weights.get(pattern, 0), frozenset(tokens.get(pattern, ())))
+        for pattern in {**weights, **tokens}
+    }
+
+KEYWORD_PATTERNS = _build_keyword_patterns()
+
+# Fixed token order and, per keyword, the token-hit matrix columns it sets
+TOKEN_SYMBOLS = tuple(COMMON_TOKENS)
+_TOKEN_COLUMNS = {token: i for i, token in enumerate(TOKEN_SYMBOLS)}
+_KEYWORD_COLUMNS = {
+    pattern: tuple(sorted(_TOKEN_COLUMNS[token] for token in tokens))
+    for pattern, (_, tokens) in KEYWORD_PATTERNS.items()
+}
+
+# Sentiment dimensions of the per-token breakdown and the range of random
+# offsets each one gets around the token's average sentiment
+SENTIMENT_DIMENSIONS = ("community", "technology", "team", "adoption", "price")
+SENTIMENT_NOISE_LOW = np.array([-0.3, -0.2, -0.2, -0.4, -0.5])
+SENTIMENT_NOISE_HIGH = np.array([0.3, 0.4, 0.2, 0.2, 0.5])
+
+# Shared generator for sentiment noise
+_RNG = np.random.default_rng()
+
+# Aho-Corasick automaton matching every keyword in a single pass over the text
+if ahocorasick is not None:
+    _KEYWORD_AUTOMATON = ahocorasick.Automaton()
+    for pattern in KEYWORD_PATTERNS:
+        _KEYWORD_AUTOMATON.add_word(pattern, pattern)
+    _KEYWORD_AUTOMATON.make_automaton()
+else:
+    _KEYWORD_AUTOMATON = None
+
+def _find_keywords(text):
+    """
+    Returns the set of KEYWORD_PATTERNS occurring anywhere in text (substring match)
+    """
+    if _KEYWORD_AUTOMATON is not None:
+        return {pattern for _, pattern in _KEYWORD_AUTOMATON.iter(text)}
+    
+    return {pattern for pattern in KEYWORD_PATTERNS if pattern in text}
+
 def get_trending_topics():
     """
     Retrieves trending topics in cryptocurrency from news and social media
@@ -23,10 +139,16 @@ def get_trending_topics():
     # Try to get real data from APIs if keys are available
     trending_data = None
     
-    if NEWS_API_KEY:
+    if NEWS_API_KEY and CRYPTO_PANIC_API_KEY:
+        # Query both sources at once so the fallback costs no extra round trip;
+        # News API results still take precedence
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            news_future = executor.submit(get_trending_from_news_api)
+            panic_future = executor.submit(get_trending_from_crypto_panic)
+            trending_data = news_future.result() or panic_future.result()
+    elif NEWS_API_KEY:
         trending_data = get_trending_from_news_api()
-    
-    if not trending_data and CRYPTO_PANIC_API_KEY:
+    elif CRYPTO_PANIC_API_KEY:
         trending_data = get_trending_from_crypto_panic()
     
     # Use mock data if APIs fail or keys are not available
@@ -35,6 +157,17 @@ def get_trending_topics():
     
     return trending_data
 
+def _fetch_json(provider, url, params):
+    """
+    Fetches a JSON document, raising on HTTP errors so failures are not cached
+    
+    Requests are throttled by the provider's shared rate limiter.
+    """
+    get_limiter(provider).acquire()
+    response = _SESSION.get(url, params=params, timeout=(3, 10))
+    response.raise_for_status()
+    return response.json()
+
 def get_trending_from_news_api():
     """
     Retrieves trending topics from News API
@@ -53,9 +186,13 @@ def get_trending_from_news_api():
             "apiKey": NEWS_API_KEY
         }
         
-        # Make API request
-        response = requests.get(url, params=params)
-        data = response.json()
+        # Make API request (the key is left out of the cache key)
+        data = cached_call(
+            "newsapi",
+            {"url": url, "params": {k: v for k, v in params.items() if k != "apiKey"}},
+            lambda: _fetch_json("newsapi", url, params),
+            max_age=API_CONFIG["newsapi"]["cache_ttl"]
+        )
         
         if data.get("status") == "ok" and data.get("articles"):
             # Extract articles
@@ -96,9 +233,13 @@ def get_trending_from_crypto_panic():
             "public": "true"
         }
         
-        # Make API request
-        response = requests.get(url, params=params)
-        data = response.json()
+        # Make API request (the key is left out of the cache key)
+        data = cached_call(
+            "cryptopanic",
+            {"url": url, "params": {k: v for k, v in params.items() if k != "auth_token"}},
+            lambda: _fetch_json("cryptopanic", url, params),
+            max_age=API_CONFIG["cryptopanic"]["cache_ttl"]
+        )
         
         if data.get("results"):
             # Extract articles
@@ -147,8 +288,25 @@ def process_articles(articles):
     """
     # Group articles by similarity in title/content
     topics = []
+    topic_scores = []
     processed_indices = set()
     
+    # Tokenize every title once and index articles by title word,
+    # so only articles sharing a word are compared
+    article_title_words = [set(article.get("title", "").lower().split()) for article in articles]
+    word_index = defaultdict(list)
+    for j, words in enumerate(article_title_words):
+        for word in words:
+            word_index[word].append(j)
+    
+    # Parse every publication time in one vectorized call; bad values become NaT
+    published = pd.to_datetime(
+        [article.get("publishedAt", "") for article in articles],
+        format="%Y-%m-%dT%H:%M:%SZ", errors="coerce", utc=True
+    )
+    date_strs = published.strftime("%B %d, %Y").fillna("Recent").tolist()
+    published_ts = ((published - pd.Timestamp(0, tz="UTC")) / pd.Timedelta(seconds=1)).fillna(0).tolist()
+    
     for i, article in enumerate(articles):
         if i in processed_indices:
             continue
@@ -157,16 +315,8 @@ def process_articles(articles):
         title = article.get("title", "")
         description = article.get("description", "")
         url = article.get("url", "")
-        published_at = article.get("publishedAt", "")
         source_name = article.get("source", {}).get("name", "News Source")
         
-        # Format date
-        try:
-            date_obj = datetime.strptime(published_at, "%Y-%m-%dT%H:%M:%SZ")
-            date_str = date_obj.strftime("%B %d, %Y")
-        except:
-            date_str = "Recent"
-        
         # Create summary from description
         summary = description if description else title
         
@@ -175,32 +325,38 @@ def process_articles(articles):
             "title": title,
             "summary": summary,
             "url": url,
-            "date": date_str,
+            "date": date_strs[i],
             "source": source_name
         })
         
         processed_indices.add(i)
         
         # Find similar articles (simple approach - title word overlap)
-        title_words = set(title.lower().split())
-        for j, other_article in enumerate(articles):
-            if j in processed_indices:
-                continue
-            
-            other_title = other_article.get("title", "").lower()
-            other_title_words = set(other_title.split())
-            
-            # If significant word overlap, consider them the same topic
-            intersection = title_words.intersection(other_title_words)
-            if len(intersection) >= min(3, len(title_words) // 2):
-                processed_indices.add(j)
-    
-    # Sort topics by estimated importance (simple approach)
-    # This would ideally involve NLP and trend analysis
-    sorted_topics = sorted(topics, key=lambda x: random.random(), reverse=True)
+        title_words = article_title_words[i]
+        min_overlap = min(3, len(title_words) // 2)
+        
+        if min_overlap == 0:
+            # Titles of one word or less group every remaining article
+            topic_scores.append((len(articles) - len(processed_indices) + 1, published_ts[i]))
+            processed_indices.update(range(len(articles)))
+            continue
+        
+        # Count shared title words for every unprocessed article sharing at least one
+        overlaps = Counter(
+            j for word in title_words for j in word_index[word]
+            if j not in processed_indices
+        )
+        
+        # If significant word overlap, consider them the same topic
+        similar = [j for j, overlap in overlaps.items() if overlap >= min_overlap]
+        processed_indices.update(similar)
+        
+        # Importance: number of articles in the group, then recency
+        topic_scores.append((len(similar) + 1, published_ts[i]))
     
-    # Limit to top N topics
-    return sorted_topics[:7]
+    # Keep the top N topics by importance
+    top_indices = heapq.nlargest(7, range(len(topics)), key=topic_scores.__getitem__)
+    return [topics[k] for k in top_indices]
 
 def extract_tokens_from_articles(articles):
     """
@@ -212,76 +368,37 @@ def extract_tokens_from_articles(articles):
     Returns:
         tuple: (trending_tokens_df, sentiment_breakdown)
     """
-    # Common cryptocurrency tokens
-    common_tokens = {
-        "BTC": "Bitcoin",
-        "ETH": "Ethereum",
-        "BNB": "Binance Coin",
-        "SOL": "Solana",
-        "XRP": "XRP",
-        "ADA": "Cardano",
-        "DOGE": "Dogecoin",
-        "SHIB": "Shiba Inu",
-        "MATIC": "Polygon",
-        "DOT": "Polkadot",
-        "LINK": "Chainlink",
-        "ATOM": "Cosmos",
-        "AVAX": "Avalanche",
-        "LTC": "Litecoin",
-        "UNI": "Uniswap"
-    }
-    
-    # Count token mentions
-    token_mentions = {token: 0 for token in common_tokens}
-    token_sentiment = {token: 0 for token in common_tokens}
-    
-    # Simple sentiment words
-    positive_words = [
-        "bullish", "surge", "soar", "gain", "rally", "climb", "rise", "positive",
-        "breakthrough", "adoption", "partnership", "success", "growth", "profit",
-        "innovation", "potential", "opportunity", "promising", "optimistic", "victory"
-    ]
-    
-    negative_words = [
-        "bearish", "plunge", "crash", "drop", "fall", "decline", "negative", "bearish",
-        "setback", "concern", "problem", "issue", "risk", "loss", "trouble", "danger",
-        "warning", "collapse", "downtrend", "pessimistic", "defeat"
-    ]
+    # One row per article: which tokens it mentions and its overall sentiment
+    token_hits = np.zeros((len(articles), len(TOKEN_SYMBOLS)), dtype=np.float64)
+    article_sentiment = np.zeros(len(articles), dtype=np.float64)
     
     # Process each article
-    for article in articles:
+    for row, article in enumerate(articles):
         title = article.get("title", "").lower()
         description = article.get("description", "").lower() if article.get("description") else ""
         
         # Combine title and description
         text = title + " " + description
         
-        # Calculate base sentiment for the article
-        article_sentiment = 0
-        for word in positive_words:
-            if word in text:
-                article_sentiment += 0.1
-        
-        for word in negative_words:
-            if word in text:
-                article_sentiment -= 0.1
+        # Find every sentiment word, token symbol and token name in one scan
+        keywords = _find_keywords(text)
         
-        # Cap sentiment between -1 and 1
-        article_sentiment = max(-1, min(1, article_sentiment))
+        # Calculate base sentiment for the article
+        article_sentiment[row] = sum(KEYWORD_PATTERNS[keyword][0] for keyword in keywords)
         
-        # Check for token mentions
-        for token, name in common_tokens.items():
-            # Check for token symbol or name
-            token_mentioned = token.lower() in text or name.lower() in text
-            
-            if token_mentioned:
-                token_mentions[token] += 1
-                token_sentiment[token] += article_sentiment
+        # Check for token mentions (symbol or name)
+        columns = [column for keyword in keywords for column in _KEYWORD_COLUMNS[keyword]]
+        token_hits[row, columns] = 1
+    
+    # Cap sentiment between -1 and 1
+    article_sentiment = np.clip(article_sentiment, -1, 1)
     
-    # Calculate average sentiment
-    for token in token_sentiment:
-        if token_mentions[token] > 0:
-            token_sentiment[token] /= token_mentions[token]
+    # Mentions and average sentiment per token as two matrix reductions
+    mention_counts = token_hits.sum(axis=0)
+    average_sentiment = (token_hits.T @ article_sentiment) / np.maximum(mention_counts, 1)
+    
+    token_mentions = dict(zip(TOKEN_SYMBOLS, mention_counts.astype(int).tolist()))
+    token_sentiment = dict(zip(TOKEN_SYMBOLS, average_sentiment.tolist()))
     
     # Create dataframe of trending tokens
     trending_data = []
@@ -296,20 +413,18 @@ def extract_tokens_from_articles(articles):
     # Sort by mentions
     trending_df = pd.DataFrame(trending_data).sort_values("mentions", ascending=False).reset_index(drop=True)
     
-    # Generate sentiment breakdown
-    sentiment_breakdown = {}
-    for token in token_mentions:
-        if token_mentions[token] > 0:
-            # Create random but sensible sentiment dimensions
-            base_sentiment = token_sentiment[token]
-            
-            sentiment_breakdown[token] = {
-                "community": min(1, max(-1, base_sentiment + random.uniform(-0.3, 0.3))),
-                "technology": min(1, max(-1, base_sentiment + random.uniform(-0.2, 0.4))),
-                "team": min(1, max(-1, base_sentiment + random.uniform(-0.2, 0.2))),
-                "adoption": min(1, max(-1, base_sentiment + random.uniform(-0.4, 0.2))),
-                "price": min(1, max(-1, base_sentiment + random.uniform(-0.5, 0.5)))
-            }
+    # Generate sentiment breakdown: random but sensible sentiment dimensions,
+    # drawn for every mentioned token at once
+    active = np.flatnonzero(mention_counts)
+    noise = _RNG.uniform(
+        SENTIMENT_NOISE_LOW, SENTIMENT_NOISE_HIGH, size=(len(active), len(SENTIMENT_DIMENSIONS))
+    )
+    dimension_values = np.clip(average_sentiment[active, None] + noise, -1, 1).tolist()
+    
+    sentiment_breakdown = {
+        TOKEN_SYMBOLS[column]: dict(zip(SENTIMENT_DIMENSIONS, values))
+        for column, values in zip(active, dimension_values)
+    }
     
     return trending_df, sentiment_breakdown
 
@@ -1,8 +1,37 @@
 import streamlit as st
+import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 from datetime import datetime
 from config import CHART_COLORS, UI_CONFIG
+try:
+    from plotly_resampler import FigureResampler
+except ImportError:
+    FigureResampler = None
+
+# The token list is fetched once an hour, not on every sidebar rerun
+@st.cache_data(ttl=3600, max_entries=4, show_spinner=False)
+def _cached_token_list():
+    from api_service import get_token_list
+    return get_token_list()
+
+# API status labels shown in the sidebar
+STATUS_CONNECTED = "✅ Connected"
+STATUS_LIMITED = "⚠️ Limited"
+STATUS_DISCONNECTED = "❌ Disconnected"
+
+# API keys only change on restart, so the status is built once per process
+@st.cache_resource(show_spinner=False)
+def _api_status():
+    import os
+    from dotenv import load_dotenv
+    load_dotenv()
+    
+    return {
+        "CoinGecko": STATUS_CONNECTED if os.getenv("COINGECKO_API_KEY") else STATUS_LIMITED,
+        "OpenAI": STATUS_CONNECTED if os.getenv("OPENAI_API_KEY") else STATUS_DISCONNECTED,
+        "News API": STATUS_CONNECTED if os.getenv("NEWS_API_KEY") else STATUS_DISCONNECTED
+    }
 
 def create_header():
     """
@@ -38,47 +67,42 @@ def create_sidebar_filters():
     
     st.sidebar.title("Analysis Settings")
     
-    # Date range selector
-    st.sidebar.subheader("Time Period")
-    filters["timeframe"] = st.sidebar.selectbox("Select Time Period", TIMEFRAMES)
-    
-    # Token selection
-    st.sidebar.subheader("Cryptocurrency Selection")
-    
     try:
-        from api_service import get_token_list
-        all_tokens = get_token_list()
+        all_tokens = _cached_token_list() or TOP_TOKENS
     except:
         all_tokens = TOP_TOKENS
     
-    filters["selected_tokens"] = st.sidebar.multiselect(
-        "Select Cryptocurrencies to Compare",
-        options=all_tokens,
-        default=TOP_TOKENS[:5]
-    )
+    # Widgets inside a form only rerun the app when the form is submitted,
+    # so adjusting several filters costs one rerun instead of one per click
+    with st.sidebar.form("analysis_settings"):
+        # Date range selector
+        st.subheader("Time Period")
+        filters["timeframe"] = st.selectbox("Select Time Period", TIMEFRAMES)
+        
+        # Token selection
+        st.subheader("Cryptocurrency Selection")
+        filters["selected_tokens"] = st.multiselect(
+            "Select Cryptocurrencies to Compare",
+            options=all_tokens,
+            default=TOP_TOKENS[:5]
+        )
+        
+        # Advanced options
+        with st.expander("Advanced Options"):
+            filters["show_indicators"] = st.checkbox("Show Technical Indicators", value=False)
+            filters["log_scale"] = st.checkbox("Logarithmic Scale", value=False)
+            filters["dark_mode"] = st.checkbox("Dark Mode", value=False)
+        
+        st.form_submit_button("Apply")
     
-    # Advanced options
-    with st.sidebar.expander("Advanced Options"):
-        filters["show_indicators"] = st.checkbox("Show Technical Indicators", value=False)
-        filters["log_scale"] = st.checkbox("Logarithmic Scale", value=False)
-        filters["dark_mode"] = st.checkbox("Dark Mode", value=False)
+    st.session_state["filters"] = filters
     
     # API status
     st.sidebar.markdown("---")
     st.sidebar.subheader("API Status")
     
     # Check API keys from environment
-    import os
-    from dotenv import load_dotenv
-    load_dotenv()
-    
-    api_status = {
-        "CoinGecko": "✅ Connected" if os.getenv("COINGECKO_API_KEY") else "⚠️ Limited",
-        "OpenAI": "✅ Connected" if os.getenv("OPENAI_API_KEY") else "❌ Disconnected",
-        "News API": "✅ Connected" if os.getenv("NEWS_API_KEY") else "❌ Disconnected"
-    }
-    
-    for api, status in api_status.items():
+    for api, status in _api_status().items():
         st.sidebar.markdown(f"**{api}**: {status}")
     
     return filters
@@ -91,21 +115,37 @@ def create_metric_cards(metrics, num_columns=4):
         metrics (list): List of metric dictionaries with 'label', 'value', and optional 'delta'
         num_columns (int): Number of columns to display
     """
+    create_metric_cards_from_lists(
+        [metric['label'] for metric in metrics],
+        [metric['value'] for metric in metrics],
+        [metric.get('delta') for metric in metrics],
+        num_columns
+    )
+
+def create_metric_cards_from_lists(labels, values, deltas=None, num_columns=4):
+    """
+    Creates metric cards in a row from parallel lists, e.g. DataFrame columns
+    
+    Args:
+        labels (list): Metric labels
+        values (list): Metric values
+        deltas (list, optional): Metric deltas, None for cards without one
+        num_columns (int): Number of columns to display
+    """
+    if deltas is None:
+        deltas = [None] * len(labels)
+    
     columns = st.columns(num_columns)
     
-    for i, metric in enumerate(metrics):
-        with columns[i % num_columns]:
-            if 'delta' in metric and metric['delta'] is not None:
-                st.metric(
-                    label=metric['label'],
-                    value=metric['value'],
-                    delta=metric['delta']
-                )
-            else:
-                st.metric(
-                    label=metric['label'],
-                    value=metric['value']
-                )
+    # Metrics fill the columns in turn, so enter each column once for all of its cards
+    for column_index, column in enumerate(columns):
+        with column:
+            for label, value, delta in zip(
+                labels[column_index::num_columns],
+                values[column_index::num_columns],
+                deltas[column_index::num_columns]
+            ):
+                st.metric(label=label, value=value, delta=delta)
 
 def create_chart(chart_type, data, **kwargs):
     """
@@ -119,6 +159,13 @@ def create_chart(chart_type, data, **kwargs):
     Returns:
         fig: Plotly figure object
     """
+    return _build_chart(chart_type, data, kwargs)
+
+# Reruns with unchanged data and options reuse the built figure
+@st.cache_data(ttl=600, max_entries=64, show_spinner=False)
+def _build_chart(chart_type, data, kwargs):
+    kwargs = dict(kwargs)
+    
     # Set default title
     title = kwargs.get('title', '')
     
@@ -129,20 +176,24 @@ def create_chart(chart_type, data, **kwargs):
     if 'color_discrete_map' not in kwargs:
         # Generate color map for tokens
         if 'color' in kwargs and kwargs['color'] in data.columns:
-            unique_values = data[kwargs['color']].unique()
-            color_map = {}
+            color_column = data[kwargs['color']]
             
-            for i, value in enumerate(unique_values):
-                if value in CHART_COLORS:
-                    color_map[value] = CHART_COLORS[value]
-                else:
-                    # Use default color or cycle through colors
-                    color_map[value] = CHART_COLORS.get('default', '#4A90E2')
+            # Categorical columns already know their values, so skip scanning every row
+            if isinstance(color_column.dtype, pd.CategoricalDtype):
+                unique_values = color_column.cat.categories
+            else:
+                unique_values = color_column.unique()
             
-            kwargs['color_discrete_map'] = color_map
+            # Use the token's color, or the default color
+            default_color = CHART_COLORS.get('default', '#4A90E2')
+            kwargs['color_discrete_map'] = {
+                value: CHART_COLORS.get(value, default_color) for value in unique_values
+            }
     
     # Create appropriate chart type
-    if chart_type == 'line':
+    if chart_type == 'line' and set(kwargs) <= _DIRECT_LINE_KWARGS and isinstance(kwargs.get('y'), str):
+        fig = _line_figure(data, **kwargs)
+    elif chart_type == 'line':
         fig = px.line(data, **kwargs)
     elif chart_type == 'bar':
         fig = px.bar(data, **kwargs)
@@ -168,8 +219,85 @@ def create_chart(chart_type, data, **kwargs):
         margin=dict(l=20, r=20, t=50, b=20)
     )
     
+    # Long line series only ship the downsampled points to the browser
+    if chart_type == 'line' and len(data) > UI_CONFIG["max_points_per_trace"]:
+        fig = go.Figure(downsample_figure(fig))
+    
     return fig
 
+# Line chart options _line_figure handles without going through Plotly Express
+_DIRECT_LINE_KWARGS = {'x', 'y', 'color', 'color_discrete_map', 'labels', 'title', 'height'}
+
+def _line_figure(data, x, y, color=None, color_discrete_map=None, labels=None, title=None, height=None):
+    """
+    Builds a line chart from graph_objects traces, one per color group
+    
+    Plotly Express would first copy and reshape the DataFrame; here each
+    trace takes its column arrays directly.
+    
+    Args:
+        data (pd.DataFrame): Data for the chart
+        x (str): Column for the x axis
+        y (str): Column for the y axis
+        color (str, optional): Column splitting the data into traces
+        color_discrete_map (dict, optional): Line color per color value
+        labels (dict, optional): Display names of columns
+        title (str, optional): Chart title
+        height (int, optional): Chart height
+    
+    Returns:
+        fig: Plotly figure object
+    """
+    labels = labels or {}
+    color_discrete_map = color_discrete_map or {}
+    groups = data.groupby(color, sort=False) if color else [(None, data)]
+    
+    fig = go.Figure()
+    
+    for name, group in groups:
+        # Long series render with WebGL, like px.line does in auto render mode
+        trace = go.Scattergl if len(group) > UI_CONFIG["webgl_point_threshold"] else go.Scatter
+        fig.add_trace(trace(
+            x=group[x].to_numpy(),
+            y=group[y].to_numpy(),
+            mode='lines',
+            name=None if name is None else str(name),
+            showlegend=name is not None,
+            line=dict(color=color_discrete_map.get(name))
+        ))
+    
+    fig.update_layout(
+        title_text=title,
+        height=height,
+        xaxis_title=labels.get(x, x),
+        yaxis_title=labels.get(y, y),
+        legend_title_text=labels.get(color, color) if color else None
+    )
+    
+    return fig
+
+def downsample_figure(fig, max_points=UI_CONFIG["max_points_per_trace"]):
+    """
+    Downsamples long traces with MinMaxLTTB before the figure is sent to the browser
+    
+    Args:
+        fig: Plotly figure object
+        max_points (int): Maximum number of points kept per trace
+    
+    Returns:
+        fig: Figure with long traces downsampled (unchanged if plotly-resampler is missing)
+    """
+    if FigureResampler is None:
+        return fig
+    
+    # Streamlit cannot call back into the resampler, so hide its zoom-level annotations
+    return FigureResampler(
+        fig,
+        default_n_shown_samples=max_points,
+        show_mean_aggregation_size=False,
+        resampled_trace_prefix_suffix=("", "")
+    )
+
 def create_section_header(title, description=None):
     """
     Creates a consistent section header with optional description
@@ -185,17 +313,23 @@ def create_section_header(title, description=None):
     
     st.markdown("---")
 
+# The footer time is shared by every session for up to a minute
+@st.cache_data(ttl=60, show_spinner=False)
+def _footer_timestamp():
+    now = datetime.now()
+    return now.year, now.strftime('%Y-%m-%d %H:%M:%S')
+
 def create_footer():
     """
     Creates a consistent footer with credits and update time
     """
-    current_year = datetime.now().year
+    current_year, refreshed_at = _footer_timestamp()
     
     st.markdown("---")
     col1, col2 = st.columns(2)
     
     with col1:
-        st.markdown(f"© {current_year} Crypto Market Analysis | Data refreshed: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+        st.markdown(f"© {current_year} Crypto Market Analysis | Data refreshed: {refreshed_at}")
     
     with col2:
         st.markdown(
@@ -207,6 +341,40 @@ def create_footer():
             unsafe_allow_html=True
         )
 
+# Dark theme stylesheet, built once at import
+DARK_THEME_CSS = """
+<style>
+    .main {
+        background-color: #121212;
+        color: #f0f0f0;
+    }
+    .stTabs [data-baseweb="tab-list"] {
+        gap: 24px;
+    }
+    .stTabs [data-baseweb="tab"] {
+        height: 50px;
+        white-space: pre-wrap;
+        background-color: #1e1e1e;
+        border-radius: 4px 4px 0px 0px;
+        gap: 1px;
+        padding-top: 10px;
+        padding-bottom: 10px;
+        color: #f0f0f0;
+    }
+    .stTabs [aria-selected="true"] {
+        background-color: #2c5ade;
+        color: white;
+    }
+    h1, h2, h3, h4, h5, h6 {
+        color: #f0f0f0;
+    }
+    .stSidebar {
+        background-color: #1e1e1e;
+        color: #f0f0f0;
+    }
+</style>
+"""
+
 def apply_theme(dark_mode=False):
     """
     Applies the selected theme to the app
@@ -215,40 +383,6 @@ def apply_theme(dark_mode=False):
         dark_mode (bool): Whether to use dark mode
     """
     if dark_mode:
-        st.markdown(
-            """
-            <style>
-            .main {
-                background-color: #121212;
-                color: #f0f0f0;
-            }
-            .stTabs [data-baseweb="tab-list"] {
-                gap: 24px;
-            }
-            .stTabs [data-baseweb="tab"] {
-                height: 50px;
-                white-space: pre-wrap;
-                background-color: #1e1e1e;
-                border-radius: 4px 4px 0px 0px;
-                gap: 1px;
-                padding-top: 10px;
-                padding-bottom: 10px;
-                color: #f0f0f0;
-            }
-            .stTabs [aria-selected="true"] {
-                background-color: #2c5ade;
-                color: white;
-            }
-            h1, h2, h3, h4, h5, h6 {
-                color: #f0f0f0;
-            }
-            .stSidebar {
-                background-color: #1e1e1e;
-                color: #f0f0f0;
-            }
-            </style>
-            """, 
-            unsafe_allow_html=True
-        )
+        st.markdown(DARK_THEME_CSS, unsafe_allow_html=True)
     else:
         st.markdown(UI_CONFIG['css'], unsafe_allow_html=True)
\ No newline at end of file
@@ -0,0 +1,89 @@
+import time
+import threading
+from config import API_CONFIG
+
+class TokenBucket:
+    """
+    Thread-safe token bucket that spaces out calls to stay under a provider's limits
+    
+    Both buckets refill continuously, so bursts are smoothed into the provider
+    ceiling instead of being sent at once and stalled on 429 responses.
+    
+    Args:
+        rpm (int): Requests allowed per period (also the burst size)
+        tpm (int, optional): Estimated tokens (e.g., LLM tokens) allowed per period
+        period (float): Period length in seconds
+    """
+    
+    def __init__(self, rpm, tpm=None, period=60):
+        self.request_capacity = float(rpm)
+        self.request_rate = rpm / period
+        self.requests = float(rpm)
+        
+        self.token_capacity = float(tpm) if tpm else None
+        self.token_rate = tpm / period if tpm else None
+        self.tokens = float(tpm) if tpm else None
+        
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+    
+    def _refill(self, now):
+        elapsed = now - self.updated_at
+        self.updated_at = now
+        self.requests = min(self.request_capacity, self.requests + elapsed * self.request_rate)
+        
+        if self.token_capacity is not None:
+            self.tokens = min(self.token_capacity, self.tokens + elapsed * self.token_rate)
+    
+    def acquire(self, est=1):
+        """
+        Blocks until one request (and est tokens, if a token limit is set) may be sent
+        
+        Args:
+            est (int): Estimated tokens consumed by the request
+        """
+        while True:
+            with self.lock:
+                self._refill(time.monotonic())
+                
+                wait = max(0.0, (1 - self.requests) / self.request_rate)
+                
+                if self.token_capacity is not None:
+                    # A single request larger than the whole bucket waits for a full bucket
+                    needed = min(est, self.token_capacity)
+                    wait = max(wait, (needed - self.tokens) / self.token_rate)
+                
+                if wait <= 0:
+                    self.requests -= 1
+                    if self.token_capacity is not None:
+                        self.tokens -= needed
+                    return
+            
+            # Sleep exactly the missing refill time, outside the lock
+            time.sleep(wait)
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+def get_limiter(provider, rpm=None, tpm=None):
+    """
+    Returns the shared limiter for an API provider, creating it on first use
+    
+    Args:
+        provider (str): Provider key in API_CONFIG (e.g., 'coingecko', 'newsapi')
+        rpm (int, optional): Overrides the configured request_limit
+        tpm (int, optional): Token limit per period
+    
+    Returns:
+        TokenBucket: Limiter shared by every caller of this provider
+    """
+    with _limiters_lock:
+        if provider not in _limiters:
+            provider_config = API_CONFIG.get(provider, {})
+            _limiters[provider] = TokenBucket(
+                rpm or provider_config["request_limit"],
+                tpm=tpm,
+                period=provider_config.get("request_period", 60)
+            )
+        
+        return _limiters[provider]
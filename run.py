@@ -3,7 +3,10 @@ import os
 import subprocess
 import argparse
 import sys
-from setup import setup_environment
+from importlib.util import find_spec
+
+# Packages the app cannot start without
+REQUIRED_MODULES = ["streamlit", "pandas", "numpy", "plotly", "requests", "dotenv", "orjson"]
 
 def check_dependencies():
     """
@@ -12,17 +15,13 @@ def check_dependencies():
     Returns:
         bool: True if all dependencies are installed, False otherwise
     """
-    try:
-        import streamlit
-        import pandas
-        import numpy
-        import plotly
-        import requests
-        import dotenv
-        return True
-    except ImportError as e:
-        print(f"Missing dependency: {e.name}")
-        return False
+    # Only locate the packages; importing them would load all of their modules
+    missing = [module for module in REQUIRED_MODULES if find_spec(module) is None]
+    
+    for module in missing:
+        print(f"Missing dependency: {module}")
+    
+    return not missing
 
 def install_dependencies():
     """
@@ -52,8 +51,16 @@ def run_app(debug=False):
         os.environ["DEBUG"] = "1"
         command.append("--logger.level=debug")
     
-    # Run the app
-    subprocess.call(command)
+    # Windows has no in-place exec, so Streamlit runs as a child process there
+    if os.name == "nt":
+        subprocess.call(command)
+        return
+    
+    # Replace this process with Streamlit instead of keeping it waiting on a child.
+    # exec discards Python's stdio buffers, so flush earlier output first.
+    sys.stdout.flush()
+    sys.stderr.flush()
+    os.execvp(command[0], command)
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Run Crypto Market Cap Analysis & Prediction application.")
@@ -85,6 +92,8 @@ if __name__ == "__main__":
     # Run setup if requested
     if args.setup:
         print("Running setup...")
+        # Imported here because setup loads the database module and its dependencies
+        from setup import setup_environment
         setup_environment()
     
     # Run the app
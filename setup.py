@@ -1,4 +1,5 @@
 import os
+import shutil
 import argparse
 from dotenv import load_dotenv
 from database import init_database
@@ -13,11 +14,7 @@ def setup_environment():
         
         # Copy template to .env
         if os.path.exists('.env.template'):
-            with open('.env.template', 'r') as template_file:
-                template_content = template_file.read()
-            
-            with open('.env', 'w') as env_file:
-                env_file.write(template_content)
+            shutil.copyfile('.env.template', '.env')
             
             print(".env file created. Please edit it to add your API keys.")
         else:
@@ -33,9 +30,11 @@ def setup_environment():
     
     # Check data directories
     data_dir = "data"
-    if not os.path.exists(data_dir):
-        print(f"Creating data directory: {data_dir}")
+    try:
         os.makedirs(data_dir)
+        print(f"Created data directory: {data_dir}")
+    except FileExistsError:
+        pass
     
     print("Setup complete!")
 
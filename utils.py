@@ -1,8 +1,59 @@
 import pandas as pd
 import numpy as np
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 import re
-import random
+from functools import lru_cache
+
+# Shared generator for random test data
+_RNG = np.random.default_rng()
+
+# Length of each timeframe, and the start of the "All Time" range
+TIMEFRAME_DELTAS = {
+    "24h": timedelta(days=1),
+    "7d": timedelta(days=7),
+    "30d": timedelta(days=30),
+    "90d": timedelta(days=90),
+    "1y": timedelta(days=365)
+}
+ALL_TIME_START = datetime(2013, 4, 28, tzinfo=timezone.utc)  # Bitcoin's first appearance on CoinGecko
+
+# Phrases naming each time period, checked in order by extract_time_period
+TIME_PERIOD_PATTERNS = [
+    (period, re.compile("|".join(map(re.escape, phrases))))
+    for period, phrases in [
+        ("24h", ["24h", "24 hour", "day"]),
+        ("7d", ["7d", "7 day", "week"]),
+        ("30d", ["30d", "30 day", "month"]),
+        ("90d", ["90d", "90 day", "3 month", "quarter"]),
+        ("1y", ["1y", "year", "12 month", "365 day"])
+    ]
+]
+
+# Common token groups, and the group of each token
+TOKEN_GROUPS = {
+    "layer1": ["BTC", "ETH", "SOL", "ADA", "DOT", "AVAX"],
+    "defi": ["UNI", "AAVE", "COMP", "MKR", "SNX", "SUSHI"],
+    "exchange": ["BNB", "CRO", "FTT", "KCS", "OKB", "HT"],
+    "meme": ["DOGE", "SHIB", "ELON", "FLOKI", "SAMO"],
+    "gaming": ["AXS", "MANA", "SAND", "ENJ", "ILV", "GALA"],
+    "oracle": ["LINK", "BAND", "API3", "TRB"],
+    "privacy": ["XMR", "ZEC", "DASH", "SCRT"],
+    "storage": ["FIL", "STORJ", "AR", "SC"]
+}
+TOKEN_TO_GROUP = {token: group for group, tokens in TOKEN_GROUPS.items() for token in tokens}
+
+# Characters stripped from user input by sanitize_input
+_SANITIZE_RE = re.compile(r'[\\\'";`$<>&|]')
+
+# Shown in place of a missing value
+NOT_AVAILABLE = "N/A"
+
+# Magnitude suffixes used by format_currency, largest first
+CURRENCY_SUFFIXES = ((1e12, "T"), (1e9, "B"), (1e6, "M"), (1e3, "K"))
+
+@lru_cache(maxsize=8)
+def _fixed_point_format(precision):
+    return "{:." + str(precision) + "f}"
 
 def format_currency(value, precision=2):
     """
@@ -16,20 +67,22 @@ def format_currency(value, precision=2):
         str: Formatted currency string
     """
     if value is None:
-        return "N/A"
+        return NOT_AVAILABLE
     
+    return _format_currency(value, precision)
+
+# Dashboards re-render the same values on every rerun, so formatted strings are memoized
+@lru_cache(maxsize=4096, typed=True)
+def _format_currency(value, precision):
     abs_value = abs(value)
+    number_format = _fixed_point_format(precision)
     
-    if abs_value >= 1e12:
-        formatted = f"${abs_value / 1e12:.{precision}f}T"
-    elif abs_value >= 1e9:
-        formatted = f"${abs_value / 1e9:.{precision}f}B"
-    elif abs_value >= 1e6:
-        formatted = f"${abs_value / 1e6:.{precision}f}M"
-    elif abs_value >= 1e3:
-        formatted = f"${abs_value / 1e3:.{precision}f}K"
+    for threshold, suffix in CURRENCY_SUFFIXES:
+        if abs_value >= threshold:
+            formatted = "$" + number_format.format(abs_value / threshold) + suffix
+            break
     else:
-        formatted = f"${abs_value:.{precision}f}"
+        formatted = "$" + number_format.format(abs_value)
     
     # Add negative sign if needed
     if value < 0:
@@ -49,9 +102,13 @@ def format_percentage(value, precision=2):
         str: Formatted percentage string
     """
     if value is None:
-        return "N/A"
+        return NOT_AVAILABLE
     
-    return f"{value:.{precision}f}%"
+    return _format_percentage(value, precision)
+
+@lru_cache(maxsize=4096, typed=True)
+def _format_percentage(value, precision):
+    return _fixed_point_format(precision).format(value) + "%"
 
 def calculate_date_range(timeframe):
     """
@@ -63,20 +120,12 @@ def calculate_date_range(timeframe):
     Returns:
         tuple: (start_date, end_date)
     """
-    end_date = datetime.now()
-    
-    if timeframe == "24h":
-        start_date = end_date - timedelta(days=1)
-    elif timeframe == "7d":
-        start_date = end_date - timedelta(days=7)
-    elif timeframe == "30d":
-        start_date = end_date - timedelta(days=30)
-    elif timeframe == "90d":
-        start_date = end_date - timedelta(days=90)
-    elif timeframe == "1y":
-        start_date = end_date - timedelta(days=365)
+    end_date = datetime.now(timezone.utc)
+    
+    if timeframe in TIMEFRAME_DELTAS:
+        start_date = end_date - TIMEFRAME_DELTAS[timeframe]
     else:  # All time
-        start_date = datetime(2013, 4, 28)  # Bitcoin's first appearance on CoinGecko
+        start_date = ALL_TIME_START
     
     return start_date, end_date
 
@@ -97,13 +146,11 @@ def generate_random_data(start_date, end_date, base_value, volatility=0.05):
     days = (end_date - start_date).days + 1
     
     # Generate dates
-    dates = [start_date + timedelta(days=i) for i in range(days)]
+    dates = pd.date_range(start_date, periods=days, freq='D')
     
-    # Generate random walk
-    values = [base_value]
-    for i in range(1, days):
-        change = random.uniform(-volatility, volatility)
-        values.append(values[-1] * (1 + change))
+    # Generate random walk as a cumulative product of daily change factors
+    changes = _RNG.uniform(-volatility, volatility, size=max(days - 1, 0))
+    values = base_value * np.cumprod(np.concatenate(([1.0], 1 + changes)))
     
     # Create dataframe
     df = pd.DataFrame({
@@ -123,20 +170,15 @@ def extract_time_period(text):
     Returns:
         str: Standardized time period
     """
-    text = text.lower()
-    
-    if "24h" in text or "24 hour" in text or "day" in text:
-        return "24h"
-    elif "7d" in text or "7 day" in text or "week" in text:
-        return "7d"
-    elif "30d" in text or "30 day" in text or "month" in text:
-        return "30d"
-    elif "90d" in text or "90 day" in text or "3 month" in text or "quarter" in text:
-        return "90d"
-    elif "1y" in text or "year" in text or "12 month" in text or "365 day" in text:
-        return "1y"
-    else:
-        return "All Time"
+    return _extract_time_period(text.lower())
+
+@lru_cache(maxsize=512)
+def _extract_time_period(text):
+    for period, pattern in TIME_PERIOD_PATTERNS:
+        if pattern.search(text):
+            return period
+    
+    return "All Time"
 
 def get_comparable_tokens(token, top_tokens, count=3):
     """
@@ -150,38 +192,28 @@ def get_comparable_tokens(token, top_tokens, count=3):
     Returns:
         list: List of comparable token symbols
     """
-    # Common token groups
-    token_groups = {
-        "layer1": ["BTC", "ETH", "SOL", "ADA", "DOT", "AVAX"],
-        "defi": ["UNI", "AAVE", "COMP", "MKR", "SNX", "SUSHI"],
-        "exchange": ["BNB", "CRO", "FTT", "KCS", "OKB", "HT"],
-        "meme": ["DOGE", "SHIB", "ELON", "FLOKI", "SAMO"],
-        "gaming": ["AXS", "MANA", "SAND", "ENJ", "ILV", "GALA"],
-        "oracle": ["LINK", "BAND", "API3", "TRB"],
-        "privacy": ["XMR", "ZEC", "DASH", "SCRT"],
-        "storage": ["FIL", "STORJ", "AR", "SC"]
-    }
-    
-    # Find group for the token
-    token_group = None
-    for group, tokens in token_groups.items():
-        if token in tokens:
-            token_group = group
-            break
+    return list(_comparable_tokens(token, tuple(top_tokens), count))
+
+@lru_cache(maxsize=512)
+def _comparable_tokens(token, top_tokens, count):
+    top_token_set = set(top_tokens)
     
     # If token is in a group, return other tokens from the same group
+    token_group = TOKEN_TO_GROUP.get(token)
+    
     if token_group:
-        comparable_tokens = [t for t in token_groups[token_group] if t != token and t in top_tokens]
+        comparable_tokens = [t for t in TOKEN_GROUPS[token_group] if t != token and t in top_token_set]
         
         # If not enough tokens in the group, add from other groups
         if len(comparable_tokens) < count:
-            additional_tokens = [t for t in top_tokens if t != token and t not in comparable_tokens]
+            already_chosen = set(comparable_tokens)
+            additional_tokens = [t for t in top_tokens if t != token and t not in already_chosen]
             comparable_tokens.extend(additional_tokens[:count - len(comparable_tokens)])
         
-        return comparable_tokens[:count]
+        return tuple(comparable_tokens[:count])
     
     # If token is not in a group, return top tokens excluding the given token
-    return [t for t in top_tokens if t != token][:count]
+    return tuple(t for t in top_tokens if t != token)[:count]
 
 def sanitize_input(text):
     """
@@ -197,6 +229,6 @@ def sanitize_input(text):
         return ""
     
     # Remove potentially dangerous characters
-    sanitized = re.sub(r'[\\\'";`$<>&|]', '', text)
+    sanitized = _SANITIZE_RE.sub('', text)
     
     return sanitized
\ No newline at end of file